@@ -0,0 +1,236 @@
+"""
+Shared aggregation layer for the stats endpoints.
+
+Each period is summarised with a single grouped statement: one UNION ALL
+branch per entity kind (rituals, quotas) plus an optional activity branch,
+so a dashboard refresh costs one round-trip regardless of how many rituals,
+quotas or logs exist. The statement reads the daily rollup rather than the
+raw log table, so a year costs at most one row per entity per day. Days are
+grouped into weeks and months by joining calendar_day on its primary key.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import func, literal, null, union_all
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import CalendarDay, LogDailyRollup, MetricType
+
+# calendar_day column holding the first day of the bucket a day falls in
+BUCKETS = {
+    "day": CalendarDay.day,
+    "week": CalendarDay.week_start,
+    "month": CalendarDay.month_start,
+}
+
+
+@dataclass
+class PeriodTotals:
+    rituals: Dict[int, float] = field(default_factory=dict)
+    quotas: Dict[int, float] = field(default_factory=dict)
+    ritual_months: Dict[int, Dict[str, float]] = field(default_factory=dict)
+    quota_months: Dict[int, Dict[str, float]] = field(default_factory=dict)
+    monthly_activity: Dict[str, int] = field(default_factory=dict)
+
+
+def _entity_branch(kind: str, id_column, metric_type: MetricType, ids, start: datetime, by_month: bool):
+    month = CalendarDay.month if by_month else null()
+    stmt = (
+        select(
+            literal(kind).label("kind"),
+            id_column.label("entity_id"),
+            month.label("month"),
+            func.sum(LogDailyRollup.total).label("total"),
+            func.sum(LogDailyRollup.entries).label("entries"),
+        )
+        .where(LogDailyRollup.metric_type == metric_type)
+        .where(id_column.in_(ids))
+        .where(LogDailyRollup.day >= start.date())
+    )
+    if by_month:
+        return stmt.join(CalendarDay, CalendarDay.day == LogDailyRollup.day).group_by(id_column, month)
+    return stmt.group_by(id_column)
+
+
+def _activity_branch(start: datetime):
+    return (
+        select(
+            literal("activity").label("kind"),
+            null().label("entity_id"),
+            CalendarDay.month.label("month"),
+            null().label("total"),
+            func.sum(LogDailyRollup.entries).label("entries"),
+        )
+        .join(CalendarDay, CalendarDay.day == LogDailyRollup.day)
+        .where(LogDailyRollup.day >= start.date())
+        .group_by(CalendarDay.month)
+    )
+
+
+def period_totals_statement(
+    start: datetime,
+    ritual_ids: Iterable[int] = (),
+    quota_ids: Iterable[int] = (),
+    by_month: bool = False,
+    activity: bool = False,
+):
+    """Build the grouped statement behind `period_totals`, or None if there is nothing to query."""
+    ritual_ids, quota_ids = list(ritual_ids), list(quota_ids)
+    branches = []
+    if ritual_ids:
+        branches.append(_entity_branch("ritual", LogDailyRollup.ritual_id, MetricType.ritual, ritual_ids, start, by_month))
+    if quota_ids:
+        branches.append(_entity_branch("quota", LogDailyRollup.quota_id, MetricType.quota, quota_ids, start, by_month))
+    if activity:
+        branches.append(_activity_branch(start))
+    if not branches:
+        return None
+    return branches[0] if len(branches) == 1 else union_all(*branches)
+
+
+def period_totals(
+    session: Session,
+    start: datetime,
+    ritual_ids: Iterable[int] = (),
+    quota_ids: Iterable[int] = (),
+    by_month: bool = False,
+    activity: bool = False,
+) -> PeriodTotals:
+    """
+    Sum ritual and quota logs from `start` onwards in one query.
+
+    With `by_month` the per-entity totals are also broken down by "YYYY-MM";
+    with `activity` the number of logs of any type per month is counted too.
+    """
+    stmt = period_totals_statement(start, ritual_ids, quota_ids, by_month, activity)
+    if stmt is None:
+        return PeriodTotals()
+    return fold_totals(session.exec(stmt), by_month)
+
+
+async def load_period_totals(
+    session: AsyncSession,
+    start: datetime,
+    ritual_ids: Iterable[int] = (),
+    quota_ids: Iterable[int] = (),
+    by_month: bool = False,
+    activity: bool = False,
+) -> PeriodTotals:
+    """`period_totals` on an async session."""
+    stmt = period_totals_statement(start, ritual_ids, quota_ids, by_month, activity)
+    if stmt is None:
+        return PeriodTotals()
+    return fold_totals(await session.exec(stmt), by_month)
+
+
+def fold_totals(rows, by_month: bool) -> PeriodTotals:
+    """Turn the (kind, entity_id, month, total, entries) rows into a PeriodTotals."""
+    totals = PeriodTotals()
+    for kind, entity_id, month, total, entries in rows:
+        if kind == "activity":
+            totals.monthly_activity[month] = entries
+            continue
+        sums = totals.rituals if kind == "ritual" else totals.quotas
+        sums[entity_id] = sums.get(entity_id, 0) + total
+        if by_month:
+            months = totals.ritual_months if kind == "ritual" else totals.quota_months
+            months.setdefault(entity_id, {})[month] = total
+
+    return totals
+
+
+def bucket_count(start: date, end: date, granularity: str) -> int:
+    """Number of buckets `bucket_starts` returns, worked out without building them."""
+    if end <= start:
+        return 0
+    if granularity == "day":
+        return (end - start).days
+    if granularity == "week":
+        first = start - timedelta(days=start.weekday())
+        return -(-(end - first).days // 7)
+    last = end - timedelta(days=1)
+    return 12 * (last.year - start.year) + last.month - start.month + 1
+
+
+def bucket_starts(start: date, end: date, granularity: str) -> List[date]:
+    """First day of every bucket overlapping [start, end), oldest first."""
+    if granularity == "week":
+        current = start - timedelta(days=start.weekday())
+    elif granularity == "month":
+        current = start.replace(day=1)
+    else:
+        current = start
+    starts = []
+    while current < end:
+        starts.append(current)
+        try:
+            if granularity == "day":
+                current += timedelta(days=1)
+            elif granularity == "week":
+                current += timedelta(days=7)
+            else:
+                current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        except OverflowError:
+            # The bucket holding date.max is the last one
+            break
+    return starts
+
+
+def _series_branch(kind: str, id_column, metric_type: MetricType, ids, start: date, end: date, granularity: str):
+    bucket = BUCKETS[granularity]
+    return (
+        select(
+            literal(kind).label("kind"),
+            id_column.label("entity_id"),
+            bucket.label("bucket"),
+            func.sum(LogDailyRollup.total).label("total"),
+        )
+        .join(CalendarDay, CalendarDay.day == LogDailyRollup.day)
+        .where(LogDailyRollup.metric_type == metric_type)
+        .where(id_column.in_(ids))
+        .where(LogDailyRollup.day >= start, LogDailyRollup.day < end)
+        .group_by(id_column, bucket)
+    )
+
+
+def range_series_statement(
+    start: date,
+    end: date,
+    granularity: str,
+    ritual_ids: Iterable[int] = (),
+    quota_ids: Iterable[int] = (),
+):
+    """Per-entity totals for every bucket in [start, end), or None if there is nothing to query."""
+    ritual_ids, quota_ids = list(ritual_ids), list(quota_ids)
+    branches = []
+    if ritual_ids:
+        branches.append(_series_branch("ritual", LogDailyRollup.ritual_id, MetricType.ritual, ritual_ids, start, end, granularity))
+    if quota_ids:
+        branches.append(_series_branch("quota", LogDailyRollup.quota_id, MetricType.quota, quota_ids, start, end, granularity))
+    if not branches:
+        return None
+    return branches[0] if len(branches) == 1 else union_all(*branches)
+
+
+async def load_range_series(
+    session: AsyncSession,
+    start: date,
+    end: date,
+    granularity: str,
+    ritual_ids: Iterable[int] = (),
+    quota_ids: Iterable[int] = (),
+) -> Dict[Tuple[str, int], Dict[str, float]]:
+    """
+    Totals keyed by ("ritual" | "quota", id), each mapping a bucket's first
+    day ("YYYY-MM-DD") to its sum. Empty buckets are absent.
+    """
+    stmt = range_series_statement(start, end, granularity, ritual_ids, quota_ids)
+    series = {}
+    if stmt is None:
+        return series
+    for kind, entity_id, bucket, total in await session.exec(stmt):
+        series.setdefault((kind, entity_id), {})[bucket.isoformat()] = total
+    return series
@@ -0,0 +1,87 @@
+"""Add ritual_week and ritual_streak
+
+Revision ID: a7d2e9c14f60
+Revises: f3c8a2d41b57
+Create Date: 2026-10-17 17:26:03.510472
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2e9c14f60'
+down_revision: Union[str, Sequence[str], None] = 'f3c8a2d41b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ritual_week',
+    sa.Column('ritual_id', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('entries', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('ritual_id', 'week_start')
+    )
+    ritual_streak = op.create_table('ritual_streak',
+    sa.Column('ritual_id', sa.Integer(), nullable=False),
+    sa.Column('first_week', sa.Date(), nullable=True),
+    sa.Column('weeks_hit', sa.Integer(), nullable=False),
+    sa.Column('latest_run', sa.Integer(), nullable=False),
+    sa.Column('latest_run_end', sa.Date(), nullable=True),
+    sa.Column('longest_run', sa.Integer(), nullable=False),
+    sa.Column('longest_run_end', sa.Date(), nullable=True),
+    sa.PrimaryKeyConstraint('ritual_id')
+    )
+
+    # Backfill the weekly totals, keyed by each week's Monday
+    op.execute(
+        "INSERT INTO ritual_week (ritual_id, week_start, total, entries) "
+        "SELECT ritual_id, date(timestamp, '-6 days', 'weekday 1'), sum(value), count(*) "
+        "FROM log WHERE metric_type = 'ritual' AND ritual_id IS NOT NULL "
+        "GROUP BY ritual_id, date(timestamp, '-6 days', 'weekday 1')"
+    )
+
+    # Backfill the streak summaries from runs of consecutive weeks on target
+    bind = op.get_bind()
+    summaries = {
+        ritual_id: {"ritual_id": ritual_id, "first_week": first, "weeks_hit": 0, "latest_run": 0,
+                    "latest_run_end": None, "longest_run": 0, "longest_run_end": None}
+        for ritual_id, first in bind.execute(sa.text(
+            "SELECT ritual_id, min(week_start) FROM ritual_week GROUP BY ritual_id"
+        ))
+    }
+    runs = bind.execute(sa.text(
+        "SELECT ritual_id, count(*), max(week_start) FROM ("
+        " SELECT w.ritual_id, w.week_start,"
+        "  CAST(julianday(w.week_start) AS INTEGER) / 7"
+        "  - row_number() OVER (PARTITION BY w.ritual_id ORDER BY w.week_start) AS run"
+        " FROM ritual_week w JOIN ritual r ON r.id = w.ritual_id"
+        " WHERE w.total >= CASE WHEN r.period = 'weekly' THEN r.target_value ELSE r.target_value / 52 END"
+        ") GROUP BY ritual_id, run"
+    ))
+    for ritual_id, length, end in runs:
+        summary = summaries[ritual_id]
+        summary["weeks_hit"] += length
+        if summary["latest_run_end"] is None or end > summary["latest_run_end"]:
+            summary["latest_run"], summary["latest_run_end"] = length, end
+        if (length, end) > (summary["longest_run"], summary["longest_run_end"] or ""):
+            summary["longest_run"], summary["longest_run_end"] = length, end
+    # Raw SQL hands dates back as ISO strings
+    for summary in summaries.values():
+        for column in ("first_week", "latest_run_end", "longest_run_end"):
+            if summary[column]:
+                summary[column] = date.fromisoformat(summary[column])
+    op.bulk_insert(ritual_streak, list(summaries.values()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ritual_streak')
+    op.drop_table('ritual_week')
@@ -0,0 +1,56 @@
+"""Add calendar_day
+
+Revision ID: b6e1d4a8f203
+Revises: a7d2e9c14f60
+Create Date: 2026-10-17 21:12:40.118305
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d4a8f203'
+down_revision: Union[str, Sequence[str], None] = 'a7d2e9c14f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    calendar_day = op.create_table('calendar_day',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('month_start', sa.Date(), nullable=False),
+    sa.Column('month', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('iso_year', sa.Integer(), nullable=False),
+    sa.Column('iso_week', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day'),
+    sqlite_with_rowid=False
+    )
+
+    # 2000-2049, widened to any logged day outside it
+    first, last = date(2000, 1, 1), date(2049, 12, 31)
+    oldest, newest = op.get_bind().execute(sa.text("SELECT min(date(timestamp)), max(date(timestamp)) FROM log")).one()
+    if oldest:
+        first, last = min(first, date.fromisoformat(oldest)), max(last, date.fromisoformat(newest))
+    rows = []
+    day = first
+    while day <= last:
+        iso_year, iso_week, _ = day.isocalendar()
+        rows.append({
+            "day": day, "week_start": day - timedelta(days=day.weekday()), "month_start": day.replace(day=1),
+            "month": day.strftime("%Y-%m"), "year": day.year, "iso_year": iso_year, "iso_week": iso_week,
+        })
+        day += timedelta(days=1)
+    op.bulk_insert(calendar_day, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('calendar_day')
@@ -0,0 +1,33 @@
+"""Add composite indexes to log
+
+Revision ID: c4a7e1f0b2d3
+Revises: 9117ecd69f4b
+Create Date: 2026-10-17 09:12:44.201733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e1f0b2d3'
+down_revision: Union[str, Sequence[str], None] = '9117ecd69f4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_log_ritual_metric_timestamp', 'log', ['ritual_id', 'metric_type', 'timestamp', 'value'], unique=False)
+    op.create_index('ix_log_quota_metric_timestamp', 'log', ['quota_id', 'metric_type', 'timestamp', 'value'], unique=False)
+    op.create_index('ix_log_timestamp', 'log', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_log_timestamp', table_name='log')
+    op.drop_index('ix_log_quota_metric_timestamp', table_name='log')
+    op.drop_index('ix_log_ritual_metric_timestamp', table_name='log')
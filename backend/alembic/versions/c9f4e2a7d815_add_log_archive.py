@@ -0,0 +1,41 @@
+"""Add archive_state and make log ids autoincrement
+
+Revision ID: c9f4e2a7d815
+Revises: b6e1d4a8f203
+Create Date: 2026-10-17 23:02:18.640571
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f4e2a7d815'
+down_revision: Union[str, Sequence[str], None] = 'b6e1d4a8f203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('archive_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cutoff', sa.DateTime(), nullable=False),
+    sa.Column('archived_logs', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Archived logs leave the log table, so SQLite must not hand their ids out
+    # again; AUTOINCREMENT needs the table to be rebuilt
+    with op.batch_alter_table('log', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('log', recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
+    op.drop_table('archive_state')
@@ -0,0 +1,50 @@
+"""Add log_daily_rollup
+
+Revision ID: d81f3b6a9c24
+Revises: c4a7e1f0b2d3
+Create Date: 2026-10-17 10:04:51.630418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f3b6a9c24'
+down_revision: Union[str, Sequence[str], None] = 'c4a7e1f0b2d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('log_daily_rollup',
+    sa.Column('metric_type', sa.Enum('ritual', 'vice', 'pomodoro', 'quota', name='metrictype'), nullable=False),
+    sa.Column('ritual_id', sa.Integer(), nullable=False),
+    sa.Column('quota_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('entries', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('metric_type', 'ritual_id', 'quota_id', 'day')
+    )
+    op.create_index('ix_log_daily_rollup_ritual', 'log_daily_rollup', ['metric_type', 'ritual_id', 'day', 'total', 'entries'], unique=False)
+    op.create_index('ix_log_daily_rollup_quota', 'log_daily_rollup', ['metric_type', 'quota_id', 'day', 'total', 'entries'], unique=False)
+    op.create_index('ix_log_daily_rollup_day', 'log_daily_rollup', ['day', 'entries'], unique=False)
+
+    # Backfill from existing logs
+    op.execute(
+        "INSERT INTO log_daily_rollup (metric_type, ritual_id, quota_id, day, total, entries) "
+        "SELECT metric_type, coalesce(ritual_id, 0), coalesce(quota_id, 0), date(timestamp), sum(value), count(*) "
+        "FROM log GROUP BY metric_type, coalesce(ritual_id, 0), coalesce(quota_id, 0), date(timestamp)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_log_daily_rollup_day', table_name='log_daily_rollup')
+    op.drop_index('ix_log_daily_rollup_quota', table_name='log_daily_rollup')
+    op.drop_index('ix_log_daily_rollup_ritual', table_name='log_daily_rollup')
+    op.drop_table('log_daily_rollup')
@@ -0,0 +1,43 @@
+"""Add log_tag index
+
+Revision ID: e5b9c0d7a316
+Revises: d81f3b6a9c24
+Create Date: 2026-10-17 11:41:08.352190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9c0d7a316'
+down_revision: Union[str, Sequence[str], None] = 'd81f3b6a9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    log_tag = op.create_table('log_tag',
+    sa.Column('tag', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('log_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['log_id'], ['log.id'], ),
+    sa.PrimaryKeyConstraint('tag', 'log_id')
+    )
+    op.create_index('ix_log_tag_log_id', 'log_tag', ['log_id'], unique=False)
+
+    # Backfill by splitting the existing space-separated tag strings
+    result = op.get_bind().execute(sa.text("SELECT id, tag FROM log WHERE tag IS NOT NULL"))
+    for chunk in result.partitions(10000):
+        rows = [{'tag': tag, 'log_id': log_id} for log_id, tag_str in chunk for tag in set(tag_str.split())]
+        if rows:
+            op.bulk_insert(log_tag, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_log_tag_log_id', table_name='log_tag')
+    op.drop_table('log_tag')
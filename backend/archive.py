@@ -0,0 +1,314 @@
+"""
+Hot/cold log archival.
+
+Only recent logs are read and written often, so logs older than
+ARCHIVE_AFTER_DAYS can be moved out of the log table into an archive
+database, `archive/<database file>` next to the live one. The log table and
+its indexes then only hold the hot part of the history. Rollups, ritual
+weeks and streaks stay in the live database, so stats do not change and
+never read the archive.
+
+Raw-log reads include the archive transparently: it is attached to the
+connection as the `archive` schema, and the log listing, the exports and
+the tag routes add the archived rows. A listing page only queries the
+archive when it reaches back past the cutoff, so recent pages cost the
+same as before. Archived logs are read-only; editing or deleting one
+answers 409.
+
+`archive_state.cutoff` in the live database decides which archived rows
+are visible: only those older than it. The job advances it one month at a
+time. For each month it holds the live database's write lock, copies the
+month's logs and tags into the archive and commits that, then deletes them
+from the live tables and moves the cutoff in a second commit. A crash in
+between leaves copies at or after the cutoff, which no read sees and the
+next run clears. After a run, a gzip-compressed copy of the archive is
+written to BACKUP_DIR; snapshots of the live database do not contain the
+archive. In multi-user mode (SHARD_DIR) the job runs on every user's shard,
+each with its own archive next to it and its copy under BACKUP_DIR/shards.
+
+Usage: python archive.py run [--days N] [--user USER] | status [--user USER]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, func
+from sqlalchemy.sql.visitors import replacement_traverse
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backup import DATABASE_STEM, backup_location, create_backup
+from database import SHARD_DIR, engine, make_engine, shards
+from local_time import local_today
+from models import ArchiveState, Log, LogTag
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_SCHEMA = "archive"
+
+ARCHIVE_METADATA = MetaData(schema=ARCHIVE_SCHEMA)
+
+
+def archive_table(table: Table) -> Table:
+    """`table`'s columns and indexes in the archive schema, without foreign keys."""
+    copy = Table(
+        table.name,
+        ARCHIVE_METADATA,
+        *(Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable) for column in table.columns),
+    )
+    for index in table.indexes:
+        Index(index.name, *(copy.c[column.name] for column in index.columns))
+    return copy
+
+
+ARCHIVE_LOG = archive_table(Log.__table__)
+ARCHIVE_LOG_TAG = archive_table(LogTag.__table__)
+
+ARCHIVED_TABLES = {Log.__table__: ARCHIVE_LOG, LogTag.__table__: ARCHIVE_LOG_TAG}
+
+
+def archive_file(database: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(database)), "archive", os.path.basename(database))
+
+
+def attach_archive(connection):
+    """Attach the archive database to `connection`'s DBAPI connection, once per connection."""
+    # connection.info lives as long as the pooled DBAPI connection
+    if not connection.info.get("archive_attached"):
+        connection.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_file(connection.engine.url.database),))
+        connection.info["archive_attached"] = True
+
+
+def open_archive(session: Session) -> Optional[datetime]:
+    """
+    Return the archive cutoff, or None while nothing is archived. When there
+    is one, the archive is attached to the session's connection.
+    """
+    state = session.get(ArchiveState, 1)
+    if state is None:
+        return None
+    attach_archive(session.connection())
+    return state.cutoff
+
+
+async def load_archive(session: AsyncSession) -> Optional[datetime]:
+    """`open_archive` on an async session."""
+    return await session.run_sync(open_archive)
+
+
+def to_archive(clause):
+    """Rewrite a clause over log and log_tag to read the archive's copies of those tables."""
+    def replace(element):
+        if isinstance(element, Table) and element in ARCHIVED_TABLES:
+            return ARCHIVED_TABLES[element]
+        if isinstance(element, Column) and element.table in ARCHIVED_TABLES:
+            return ARCHIVED_TABLES[element.table].c[element.name]
+        return None
+    return replacement_traverse(clause, {}, replace)
+
+
+def archived_logs(cutoff: datetime, filters: Iterable = ()):
+    """Select the visible archived logs matching `filters` (written against Log)."""
+    # SQLite bounds the timestamp index scan with the first upper bound it
+    # meets, so the cutoff goes last: a range filter or cursor is usually tighter
+    return select(*ARCHIVE_LOG.c).where(*(to_archive(f) for f in filters), ARCHIVE_LOG.c.timestamp < cutoff)
+
+
+def with_archive(query, cutoff: Optional[datetime]):
+    """`query` (over Log) followed by the same query over the visible archived logs."""
+    if cutoff is None:
+        return query
+    return query.union_all(to_archive(query).where(ARCHIVE_LOG.c.timestamp < cutoff))
+
+
+def all_logs(session: Session):
+    """Subquery over the live and the visible archived logs, with the log table's columns."""
+    return with_archive(select(Log), open_archive(session)).subquery()
+
+
+def visible_archived_tags(cutoff: datetime):
+    """Select (tag, log_id) for the archived logs older than `cutoff`."""
+    return (
+        select(ARCHIVE_LOG_TAG.c.tag, ARCHIVE_LOG_TAG.c.log_id)
+        .join(ARCHIVE_LOG, ARCHIVE_LOG.c.id == ARCHIVE_LOG_TAG.c.log_id)
+        .where(ARCHIVE_LOG.c.timestamp < cutoff)
+    )
+
+
+async def archived_ids(session: AsyncSession, ids: Iterable[int]) -> List[int]:
+    """Those of `ids` that belong to archived logs."""
+    cutoff = await load_archive(session)
+    ids = list(ids)
+    if cutoff is None or not ids:
+        return []
+    return (await session.exec(
+        select(ARCHIVE_LOG.c.id).where(ARCHIVE_LOG.c.id.in_(ids), ARCHIVE_LOG.c.timestamp < cutoff)
+    )).all()
+
+
+# --- The archival job ---
+
+# Seconds between months, during which writers can take the lock
+ARCHIVE_STEP_PAUSE = 0.05
+# SQLAlchemy's storage format for DateTime on SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+LOG_COLUMNS = ", ".join(column.name for column in Log.__table__.columns)
+
+
+def month_bounds(first: datetime, last: datetime) -> List[datetime]:
+    """The first of every month after `first` and before `last`, then `last`."""
+    bounds = []
+    current = (first.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + timedelta(days=32)).replace(day=1)
+    while current < last:
+        bounds.append(current)
+        current = (current + timedelta(days=32)).replace(day=1)
+    return bounds + [last]
+
+
+def create_archive(bind=engine) -> str:
+    """Create the archive database and its tables if missing; returns its path."""
+    path = archive_file(bind.url.database)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with bind.connect() as connection:
+        attach_archive(connection)
+        ARCHIVE_METADATA.create_all(connection)
+        connection.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+        connection.commit()
+    return path
+
+
+def connect(path: str) -> sqlite3.Connection:
+    # Transactions are explicit; waits for the app's writers like busy_timeout does there
+    return sqlite3.connect(path, isolation_level=None, timeout=30)
+
+
+def archive_logs(days: int = ARCHIVE_AFTER_DAYS, bind=engine, pause: float = ARCHIVE_STEP_PAUSE) -> dict:
+    """
+    Move logs from before the start of the local day `days` ago into the
+    archive, one month per step. Returns the new cutoff and the number of logs moved.
+    """
+    database = bind.url.database
+    path = create_archive(bind)
+    target = datetime.combine(local_today() - timedelta(days=days), datetime.min.time())
+    live = connect(database)
+    cold = connect(path)
+    try:
+        cold.execute("ATTACH DATABASE ? AS live", (database,))
+        row = live.execute("SELECT cutoff FROM archive_state WHERE id = 1").fetchone()
+        cutoff = row[0] if row else None
+
+        # Copies at or after the cutoff are left over from an interrupted run
+        # (or a reset / restore); no read sees them, so start from a clean slate
+        cold.execute("BEGIN")
+        stale = "SELECT id FROM log" + (" WHERE timestamp >= ?" if cutoff else "")
+        cold.execute(f"DELETE FROM log_tag WHERE log_id IN ({stale})", (cutoff,) if cutoff else ())
+        cold.execute(stale.replace("SELECT id", "DELETE", 1), (cutoff,) if cutoff else ())
+        cold.execute("COMMIT")
+
+        moved = 0
+        oldest = live.execute("SELECT min(timestamp) FROM log").fetchone()[0]
+        first = datetime.fromisoformat(oldest) if oldest else target
+        for bound in month_bounds(min(first, target), target):
+            before = bound.strftime(SQLITE_DATETIME_FORMAT)
+            # Holding the write lock keeps the month unchanged between copy and delete
+            live.execute("BEGIN IMMEDIATE")
+            try:
+                cold.execute("BEGIN")
+                count = cold.execute(
+                    f"INSERT OR REPLACE INTO log ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM live.log WHERE timestamp < ?", (before,)
+                ).rowcount
+                cold.execute(
+                    "INSERT OR REPLACE INTO log_tag (tag, log_id) SELECT t.tag, t.log_id FROM live.log_tag t "
+                    "JOIN live.log l ON l.id = t.log_id WHERE l.timestamp < ?", (before,)
+                )
+                cold.execute("COMMIT")
+                live.execute("DELETE FROM log_tag WHERE log_id IN (SELECT id FROM log WHERE timestamp < ?)", (before,))
+                live.execute("DELETE FROM log WHERE timestamp < ?", (before,))
+                # Never moves back: hot logs older than the cutoff were written after the last run
+                live.execute(
+                    "INSERT INTO archive_state (id, cutoff, archived_logs, updated_at) VALUES (1, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET cutoff = max(cutoff, excluded.cutoff), "
+                    "archived_logs = archived_logs + excluded.archived_logs, updated_at = excluded.updated_at",
+                    (before, count, datetime.utcnow().strftime(SQLITE_DATETIME_FORMAT)),
+                )
+                live.execute("COMMIT")
+            except BaseException:
+                if cold.in_transaction:
+                    cold.execute("ROLLBACK")
+                live.execute("ROLLBACK")
+                raise
+            moved += count
+            time.sleep(pause)
+        cutoff = live.execute("SELECT cutoff FROM archive_state WHERE id = 1").fetchone()[0]
+    finally:
+        cold.close()
+        live.close()
+    return {"cutoff": cutoff, "moved": moved}
+
+
+def archive_status(bind=engine) -> dict:
+    with Session(bind) as session:
+        cutoff = open_archive(session)
+        hot = session.exec(select(func.count()).select_from(Log)).one()
+        archived = session.exec(select(func.count()).select_from(archived_logs(cutoff).subquery())).one() if cutoff else 0
+    path = archive_file(bind.url.database)
+    return {
+        "cutoff": cutoff.isoformat() if cutoff else None,
+        "hot_logs": hot,
+        "archived_logs": archived,
+        "database_bytes": os.path.getsize(bind.url.database),
+        "archive_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+    }
+
+
+def run(days: int, bind=engine, user: Optional[str] = None, backup: bool = True):
+    """Archive the database behind `bind` (`user`'s shard or the main one) and report to stdout."""
+    result = archive_logs(days, bind)
+    path = archive_file(bind.url.database)
+    print(f"✅ Archived {result['moved']} logs; logs before {result['cutoff']} are in {path}")
+    if backup:
+        # Outside the snapshot names, so rotation keeps it; each run replaces it
+        archive_engine = make_engine(f"sqlite:///{path}")
+        copy = create_backup(name=f"{user or DATABASE_STEM}-archive.db", keep=None, bind=archive_engine, user=user)
+        archive_engine.dispose()
+        print(f"✅ Archive copy: {os.path.join(backup_location(user)[0], copy['name'])} ({copy['bytes']} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old logs to the archive database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_command = commands.add_parser("run", help="archive logs older than --days")
+    run_command.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="keep this many days of logs hot")
+    run_command.add_argument("--no-backup", action="store_true", help="skip the compressed copy of the archive")
+    status = commands.add_parser("status", help="show the cutoff and how many logs are hot and archived")
+    for command in (run_command, status):
+        command.add_argument("--user", help="only this user's shard (with SHARD_DIR)")
+    args = parser.parse_args()
+    if args.user and not SHARD_DIR:
+        sys.exit("❌ --user needs SHARD_DIR")
+
+    # With SHARD_DIR the users' logs are in their shards, not the main database
+    users = [args.user] if args.user else shards.users() if SHARD_DIR else [None]
+    if not users:
+        print(f"No shards in {SHARD_DIR}")
+    for user in users:
+        if user:
+            print(f"== {user}")
+        try:
+            with shards.engine(user) if user else nullcontext(engine) as bind:
+                if args.command == "run":
+                    run(args.days, bind, user, backup=not args.no_backup)
+                else:
+                    for key, value in archive_status(bind).items():
+                        print(f"{key:>15}  {value}")
+        except FileNotFoundError as e:
+            sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
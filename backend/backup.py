@@ -0,0 +1,291 @@
+"""
+Online backups, rotation and restore through the SQLite backup API.
+
+The backup API copies the database page by page from a live connection,
+so a snapshot is consistent even while other workers keep writing, and it
+includes changes still in the WAL file (a plain file copy could be torn or
+miss them). Snapshots are copied BACKUP_PAGES_PER_STEP pages at a time with
+a short pause between steps, so writers are never held up for long; if
+another connection writes in between, SQLite restarts the copy so the
+result is still a single point in time.
+
+Snapshots go to BACKUP_DIR (default: `backups` next to the database),
+gzip-compressed unless asked otherwise, and only the newest BACKUP_KEEP are
+kept. In multi-user mode (SHARD_DIR, see database.py) the users' data lives
+in their shards, not the main database: a backup then snapshots every
+shard into BACKUP_DIR/shards, named and rotated per user, and a restore
+names the user whose shard it replaces. A restore stages the snapshot, checks it, brings its schema to head
+with migrate.py, takes a safety snapshot of the live database and then
+copies the staged file into the live database, all while the server keeps
+running.
+
+Usage: python backup.py create [--no-compress] [--user USER] | list [--user USER] | restore NAME [--user USER] [--yes]
+"""
+
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from database import SHARD_DIR, engine, migrate_file, shards, sqlite_file_name
+from models import DataVersion
+from versions import NAMESPACES
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(os.path.dirname(os.path.abspath(sqlite_file_name)), "backups"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "1024"))
+# Seconds between steps, during which writers can take the lock
+BACKUP_STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.005"))
+
+DATABASE_STEM = os.path.splitext(os.path.basename(sqlite_file_name))[0]
+# Snapshots of the users' shards, named after the user
+SHARD_BACKUP_DIR = os.path.join(BACKUP_DIR, "shards")
+
+
+def backup_name_pattern(stem: str) -> re.Pattern:
+    return re.compile(rf"^{re.escape(stem)}-\d{{8}}-\d{{6}}(-[\w-]+)?\.db(\.gz)?$")
+
+
+BACKUP_NAME = backup_name_pattern(DATABASE_STEM)
+
+
+def backup_location(user: Optional[str] = None) -> Tuple[str, str]:
+    """Directory and name stem of the snapshots of `user`'s shard, or of the main database."""
+    return (SHARD_BACKUP_DIR, user) if user else (BACKUP_DIR, DATABASE_STEM)
+
+
+def snapshot(destination: str, bind=engine, pages: int = BACKUP_PAGES_PER_STEP, pause: float = BACKUP_STEP_PAUSE) -> str:
+    """Copy the database behind `bind` to `destination` and return the destination path."""
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    source = bind.raw_connection()
+    try:
+        target = sqlite3.connect(destination)
+        try:
+            source.driver_connection.backup(target, pages=pages, progress=lambda *_: time.sleep(pause) if pause else None)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return destination
+
+
+def backup_info(name: str, user: Optional[str] = None) -> dict:
+    directory, _ = backup_location(user)
+    stat = os.stat(os.path.join(directory, name))
+    info = {"name": name, "bytes": stat.st_size, "created": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds")}
+    if user:
+        info["user"] = user
+    return info
+
+
+def list_backups(user: Optional[str] = None) -> List[dict]:
+    """Snapshots of `user`'s shard (or of the main database), newest first."""
+    directory, stem = backup_location(user)
+    if not os.path.isdir(directory):
+        return []
+    pattern = backup_name_pattern(stem)
+    # Names embed the timestamp, so they sort chronologically
+    return [backup_info(name, user) for name in sorted(os.listdir(directory), reverse=True) if pattern.match(name)]
+
+
+def rotate(keep: int = BACKUP_KEEP, user: Optional[str] = None) -> List[str]:
+    """Delete all but the newest `keep` snapshots; returns the deleted names."""
+    directory, _ = backup_location(user)
+    expired = [backup["name"] for backup in list_backups(user)[keep:]]
+    for name in expired:
+        os.remove(os.path.join(directory, name))
+    return expired
+
+
+def create_backup(
+    label: Optional[str] = None,
+    compress: bool = True,
+    keep: Optional[int] = BACKUP_KEEP,
+    name: Optional[str] = None,
+    bind=None,
+    user: Optional[str] = None,
+) -> dict:
+    """
+    Snapshot the database behind `bind` (by default `user`'s shard, or the
+    live main database) into its backup directory, then keep the newest
+    `keep` (all when None). `name` replaces the timestamped snapshot name,
+    without the .gz suffix.
+    """
+    if bind is None:
+        if user:
+            with shards.engine(user) as shard_engine:
+                return create_backup(label, compress, keep, name, shard_engine, user)
+        bind = engine
+    directory, stem = backup_location(user)
+    os.makedirs(directory, exist_ok=True)
+    name = name or f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{f'-{label}' if label else ''}.db"
+    fd, staged = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        snapshot(staged, bind)
+        if compress:
+            name += ".gz"
+            with open(staged, "rb") as source, gzip.open(f"{staged}.gz", "wb", compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            os.replace(f"{staged}.gz", staged)
+        # Appears under its final name only once complete
+        os.replace(staged, os.path.join(directory, name))
+    finally:
+        for path in (staged, f"{staged}.gz"):
+            if os.path.exists(path):
+                os.remove(path)
+    if keep is not None:
+        rotate(keep, user)
+    return backup_info(name, user)
+
+
+def create_shard_backups(label: Optional[str] = None, compress: bool = True, keep: Optional[int] = BACKUP_KEEP) -> List[dict]:
+    """Snapshot every user's shard; each user keeps their own newest `keep`."""
+    return [create_backup(label, compress, keep, user=user) for user in shards.users()]
+
+
+def list_shard_backups() -> List[dict]:
+    """Every user's shard snapshots, by user and then newest first."""
+    return [backup for user in shards.users() for backup in list_backups(user)]
+
+
+def stage_backup(name: str, staged: str, user: Optional[str] = None):
+    """Decompress snapshot `name` to `staged`, check it and migrate it to the current schema."""
+    directory, stem = backup_location(user)
+    if not backup_name_pattern(stem).match(name):
+        raise ValueError(f"Not a backup name: {name}")
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Backup not found: {name}")
+    with (gzip.open(path, "rb") if name.endswith(".gz") else open(path, "rb")) as source, open(staged, "wb") as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+    connection = sqlite3.connect(staged)
+    try:
+        if connection.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+            raise ValueError(f"Backup {name} failed the integrity check")
+        if not connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'alembic_version'").fetchone():
+            raise ValueError(f"Backup {name} has no migration history")
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Backup {name} is not a readable database: {e}")
+    finally:
+        connection.close()
+
+    try:
+        migrate_file(staged)
+    except RuntimeError as e:
+        raise ValueError(f"Backup {name} could not be migrated: {e}")
+
+
+def restore_backup(name: str, user: Optional[str] = None) -> dict:
+    """
+    Replace the live database (or `user`'s shard) with snapshot `name`, after
+    saving the live data as a `pre-restore` snapshot. Returns the restored
+    and safety snapshot names.
+    """
+    if user:
+        with shards.engine(user) as shard_engine:
+            return restore_into(name, shard_engine, user)
+    return restore_into(name, engine)
+
+
+def restore_into(name: str, bind, user: Optional[str] = None) -> dict:
+    directory, _ = backup_location(user)
+    os.makedirs(directory, exist_ok=True)
+    fd, staged = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        stage_backup(name, staged, user)
+        # Not rotated, so the snapshot being restored cannot be pruned by it
+        safety = create_backup("pre-restore", keep=None, bind=bind, user=user)
+
+        with Session(bind) as session:
+            live_versions = dict(session.exec(select(DataVersion.namespace, DataVersion.version)).all())
+        source = sqlite3.connect(staged)
+        target = bind.raw_connection()
+        try:
+            # One step: the live database switches over in a single write transaction
+            source.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+
+        # The snapshot brings back older data-version counters; move them past
+        # every version handed out before, so no stale ETag can match
+        with Session(bind) as session:
+            stmt = insert(DataVersion.__table__)
+            session.exec(stmt.on_conflict_do_update(
+                index_elements=["namespace"],
+                set_={"version": func.max(DataVersion.__table__.c.version, stmt.excluded.version)},
+            ), params=[{"namespace": namespace, "version": live_versions.get(namespace, 0) + 1} for namespace in NAMESPACES])
+            session.commit()
+    finally:
+        for path in (staged, f"{staged}-wal", f"{staged}-shm", f"{staged}.migrate.lock"):
+            if os.path.exists(path):
+                os.remove(path)
+    return {"restored": name, "safety_backup": safety["name"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of the Game of Life database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="snapshot the live database, or with SHARD_DIR every user's shard")
+    create.add_argument("--no-compress", action="store_true", help="store a plain .db file")
+    create.add_argument("--keep", type=int, default=BACKUP_KEEP, help="snapshots to keep after rotating")
+    listing = commands.add_parser("list", help="list snapshots, newest first")
+    restore = commands.add_parser("restore", help="replace the live database with a snapshot")
+    restore.add_argument("name")
+    restore.add_argument("--yes", action="store_true", help="do not ask for confirmation")
+    for command in (create, listing, restore):
+        command.add_argument("--user", help="only this user's shard (with SHARD_DIR)")
+    args = parser.parse_args()
+    if args.user and not SHARD_DIR:
+        sys.exit("❌ --user needs SHARD_DIR")
+
+    if args.command == "create":
+        try:
+            if args.user or not SHARD_DIR:
+                backups = [create_backup(compress=not args.no_compress, keep=args.keep, user=args.user)]
+            else:
+                backups = create_shard_backups(compress=not args.no_compress, keep=args.keep)
+        except FileNotFoundError as e:
+            sys.exit(f"❌ {e}")
+        for backup in backups:
+            directory, _ = backup_location(backup.get("user"))
+            print(f"✅ Backup created: {os.path.join(directory, backup['name'])} ({backup['bytes']} bytes)")
+        if not backups:
+            print(f"No shards in {SHARD_DIR}")
+    elif args.command == "list":
+        for backup in list_backups(args.user) if args.user or not SHARD_DIR else list_shard_backups():
+            print(f"{backup['created']}  {backup['bytes']:>12}  {backup['name']}")
+    else:
+        if SHARD_DIR and not args.user:
+            sys.exit("❌ With SHARD_DIR set, name the user whose shard to restore with --user")
+        if not args.yes:
+            print(f"⚠️  This replaces ALL current data with {args.name}.")
+            print("Press Ctrl+C to cancel, or Enter to continue...")
+            try:
+                input()
+            except KeyboardInterrupt:
+                print("\n❌ Restore cancelled.")
+                return
+        try:
+            result = restore_backup(args.name, args.user)
+        except (ValueError, FileNotFoundError) as e:
+            sys.exit(f"❌ {e}")
+        print(f"✅ Restored {result['restored']}; previous data saved as {result['safety_backup']}")
+
+
+if __name__ == "__main__":
+    main()
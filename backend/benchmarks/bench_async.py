@@ -0,0 +1,139 @@
+"""
+Async route concurrency benchmark.
+
+Serves the app with one uvicorn worker and, next to the real async routes,
+sync twins that run the same queries through the threadpool-bound sync
+Session. A few hundred concurrent clients then hit each variant and the
+p50/p99 latencies are compared. The read cache is disabled so every request
+reaches the database.
+
+Under enough load the sync twins can also exhaust their connection pool,
+because a sync session is released in the same threadpool its waiting
+requests occupy; those requests show up as errors.
+
+Usage: python -m benchmarks.bench_async [--rows 50000] [--clients 300] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from fastapi import Depends
+from sqlmodel import Session, select
+
+from aggregation import period_totals
+from database import get_session
+from main import app
+from models import Log, Quota, Ritual
+from benchmarks.common import remove_database, temp_engine
+from benchmarks.generate_data import generate_logs
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {
+    "async": ["/logs/", "/stats/weekly"],
+    "sync": ["/bench/sync/logs", "/bench/sync/stats/weekly"],
+}
+
+
+@app.get("/bench/sync/logs", response_model=List[Log], include_in_schema=False)
+def sync_logs(session: Session = Depends(get_session)):
+    return session.exec(select(Log).order_by(Log.timestamp.desc(), Log.id.desc()).limit(101)).all()[:100]
+
+
+@app.get("/bench/sync/stats/weekly", include_in_schema=False)
+def sync_weekly_totals(session: Session = Depends(get_session)):
+    today = datetime.utcnow().date()
+    start = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
+    rituals = session.exec(select(Ritual).order_by(Ritual.sort_order)).all()
+    quotas = session.exec(select(Quota)).all()
+    totals = period_totals(session, start, [r.id for r in rituals], [q.id for q in quotas])
+    return {"rituals": totals.rituals, "quotas": totals.quotas}
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(statistics.quantiles(values, n=100)[q - 1] * 1000, 1) if len(values) > 1 else 0.0
+
+
+async def load(base_url: str, paths: List[str], clients: int, seconds: float) -> dict:
+    latencies = []
+    errors = Counter()
+    stop = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker(i: int):
+            path = paths[i % len(paths)]
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors[str(response.status_code)] += 1
+                except httpx.TransportError as e:
+                    # Timeouts and dropped connections count as failed requests
+                    errors[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+
+    return {
+        "requests": len(latencies),
+        "errors": dict(errors),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000, help="logs to seed before measuring")
+    parser.add_argument("--clients", type=int, default=300, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each run")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    engine, path = temp_engine()
+    generate_logs(engine, args.rows)
+    engine.dispose()
+    env = dict(os.environ, SQLITE_URL=f"sqlite:///{path}", CACHE_TTL_SECONDS="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_async:app", "--port", str(args.port), "--log-level", "critical", "--timeout-keep-alive", "60"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    report = {"rows": args.rows, "clients": args.clients}
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                httpx.get(base_url + "/")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.2)
+        for name in args.variants:
+            report[name] = asyncio.run(load(base_url, VARIANTS[name], args.clients, args.seconds))
+    finally:
+        server.terminate()
+        server.wait()
+        remove_database(path)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
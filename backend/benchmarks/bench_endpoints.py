@@ -0,0 +1,237 @@
+"""
+Endpoint benchmark suite for the stats and log routes.
+
+For every data size it generates a database (see generate_data.py), then
+times each endpoint of routes/stats.py and routes/logs.py through
+TestClient: a few warm-up calls, then `--repeat` timed calls, reported as
+min / median / p95 / mean milliseconds. Read endpoints run first, then the
+write endpoints, which create, update and delete their own logs so the
+data size stays about the same. The read cache is off unless `--cache` is
+given, so every call reaches the database.
+
+/stats/stream is not included: TestClient cannot disconnect from an
+endless response. Each push it makes costs one /stats/weekly computation.
+
+The JSON report goes to stdout or `--output`. Pass an earlier report as
+`--compare` to add each endpoint's median change against it.
+
+Usage: python -m benchmarks.bench_endpoints [--rows 10000 100000] [--repeat 20] [--output report.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from cache import cache
+from main import app
+from benchmarks.common import remove_database, temp_engine, use_engine
+from benchmarks.generate_data import generate_logs
+
+WARMUP = 2
+BATCH_SIZE = 30
+
+
+def new_log(i: int) -> dict:
+    return {"ritual_id": 1 + i % 11, "value": 15, "metric_type": "ritual", "tag": "#bench #run"}
+
+
+def read_cases(client: TestClient) -> List[Tuple[str, Callable[[], Response]]]:
+    today = date.today()
+    year_ago = (today - timedelta(days=365)).isoformat()
+    tomorrow = (today + timedelta(days=1)).isoformat()
+    first_page = client.get("/logs/", params={"limit": 100})
+    cursor = first_page.headers.get("X-Next-Cursor", "")
+
+    def deep_page():
+        # Follow the cursor ten pages down
+        response, next_cursor = None, None
+        for _ in range(10):
+            response = client.get("/logs/", params={"limit": 100, **({"cursor": next_cursor} if next_cursor else {})})
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+        return response
+
+    return [
+        ("GET /stats/weekly", lambda: client.get("/stats/weekly")),
+        ("GET /stats/monthly", lambda: client.get("/stats/monthly")),
+        ("GET /stats/yearly", lambda: client.get("/stats/yearly")),
+        ("GET /stats/range day 90d", lambda: client.get("/stats/range", params={
+            "start": (today - timedelta(days=89)).isoformat(), "end": tomorrow, "granularity": "day"})),
+        ("GET /stats/range week 1y", lambda: client.get("/stats/range", params={"start": year_ago, "end": tomorrow})),
+        ("GET /stats/range month all", lambda: client.get("/stats/range", params={
+            "start": "2000-01-01", "end": tomorrow, "granularity": "month"})),
+        ("GET /stats/streaks", lambda: client.get("/stats/streaks")),
+        ("GET /stats/streaks history 52w", lambda: client.get("/stats/streaks", params={"history_weeks": 52})),
+        ("GET /logs/", lambda: client.get("/logs/")),
+        ("GET /logs/ limit 1000", lambda: client.get("/logs/", params={"limit": 1000})),
+        ("GET /logs/ second page", lambda: client.get("/logs/", params={"limit": 100, "cursor": cursor})),
+        ("GET /logs/ 10 pages", deep_page),
+        ("GET /logs/ ritual filter", lambda: client.get("/logs/", params={"ritual_id": 3})),
+        ("GET /logs/ tag filter", lambda: client.get("/logs/", params={"tag": "#tag5"})),
+        ("GET /logs/ date range", lambda: client.get("/logs/", params={"start": year_ago, "end": (today - timedelta(days=300)).isoformat()})),
+        ("GET /logs/tags", lambda: client.get("/logs/tags")),
+        ("GET /logs/tags/counts", lambda: client.get("/logs/tags/counts")),
+        ("GET /logs/export csv 30d", lambda: client.get("/logs/export", params={"start": (today - timedelta(days=30)).isoformat()})),
+        ("GET /logs/export parquet 30d", lambda: client.get("/logs/export", params={
+            "format": "parquet", "start": (today - timedelta(days=30)).isoformat()})),
+        ("GET /logs/export arrow 30d", lambda: client.get("/logs/export", params={
+            "format": "arrow", "start": (today - timedelta(days=30)).isoformat()})),
+    ]
+
+
+def write_cases(client: TestClient) -> List[Tuple[str, Callable[[], Response]]]:
+    created: List[int] = []
+    updated: List[int] = []
+    pool: List[int] = []
+    counter = iter(range(sys.maxsize))
+    import_file = client.get("/logs/export", params={"format": "parquet", "start": (date.today() - timedelta(days=2)).isoformat()}).content
+
+    def create():
+        response = client.post("/logs/", json=new_log(next(counter)))
+        created.append(response.json()["id"])
+        return response
+
+    def update():
+        log_id = created.pop()
+        updated.append(log_id)
+        return client.put(f"/logs/{log_id}", json={**new_log(next(counter)), "value": 20, "tag": "#bench"})
+
+    def remove():
+        return client.delete(f"/logs/{updated.pop()}")
+
+    def batch():
+        # Create a third, update the logs kept from earlier batches and delete the last batch's creations
+        third = BATCH_SIZE // 3
+        updates, deletes = pool[:third], pool[third:2 * third]
+        operations = [{"action": "create", "log": new_log(next(counter))} for _ in range(third)]
+        operations += [{"action": "update", "log_id": log_id, "log": new_log(next(counter))} for log_id in updates]
+        operations += [{"action": "delete", "log_id": log_id} for log_id in deletes]
+        response = client.post("/logs/batch", json={"operations": operations})
+        pool[:] = [log_id for log_id in pool if log_id not in deletes]
+        pool.extend(log["id"] for log in response.json()["logs"] if log["id"] not in updates)
+        return response
+
+    def import_parquet():
+        return client.post("/logs/import", files={"file": ("logs.parquet", import_file)})
+
+    return [
+        ("POST /logs/", create),
+        ("PUT /logs/{id}", update),
+        ("DELETE /logs/{id}", remove),
+        (f"POST /logs/batch {BATCH_SIZE} ops", batch),
+        ("POST /logs/import parquet 2d", import_parquet),
+    ]
+
+
+def measure(call: Callable[[], Response], repeat: int) -> dict:
+    for _ in range(WARMUP):
+        call().raise_for_status()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = call()
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    timings.sort()
+    return {
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "bytes": len(response.content),
+    }
+
+
+def run_size(client: TestClient, rows: int, args) -> dict:
+    engine, path = temp_engine()
+    try:
+        started = time.perf_counter()
+        generate_logs(engine, rows, years=args.years)
+        result = {
+            "rows": rows,
+            "generate_seconds": round(time.perf_counter() - started, 3),
+            "database_bytes": os.path.getsize(path),
+            "endpoints": {},
+        }
+        use_engine(app, engine)
+        # Writes must run after the reads so they do not shift the data under them,
+        # and the write cases build on each other in order
+        for cases in (read_cases, write_cases):
+            for name, call in cases(client):
+                result["endpoints"][name] = measure(call, args.repeat)
+                print(f"{rows:>10} {name:<32} {result['endpoints'][name]['median_ms']:>10.2f} ms", file=sys.stderr)
+        return result
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        remove_database(path)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(report: dict, baseline: dict) -> Dict[str, Dict[str, float]]:
+    """Median change per endpoint and size, as new / old (below 1 is faster)."""
+    previous = {run["rows"]: run["endpoints"] for run in baseline["runs"]}
+    changes = {}
+    for run in report["runs"]:
+        old = previous.get(run["rows"], {})
+        for name, timing in run["endpoints"].items():
+            if name in old and old[name]["median_ms"]:
+                changes.setdefault(str(run["rows"]), {})[name] = round(timing["median_ms"] / old[name]["median_ms"], 3)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="data sizes to benchmark")
+    parser.add_argument("--years", type=int, default=3, help="years the generated logs span")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per endpoint")
+    parser.add_argument("--cache", action="store_true", help="keep the read cache on")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier report to compare medians against")
+    args = parser.parse_args()
+
+    if not args.cache:
+        cache.ttl = 0
+    client = TestClient(app)
+    report = {
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "cache": args.cache,
+        "runs": [run_size(client, rows, args) for rows in args.rows],
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
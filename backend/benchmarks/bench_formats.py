@@ -0,0 +1,98 @@
+"""
+Round-trip benchmark: CSV vs Parquet vs Arrow IPC.
+
+Exports a generated log table through /logs/export in each format, then loads
+it into an empty database. Parquet and Arrow go through POST /logs/import;
+CSV has no import endpoint, so its load side is parsing the text back into
+typed rows plus the same batched insert and rollup rebuild.
+
+Usage: python -m benchmarks.bench_formats [--rows 1000000]
+"""
+
+import argparse
+import csv
+import io
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from main import app
+from models import Log, MetricType
+from rollup import rebuild_rollup
+from benchmarks.common import remove_database, temp_engine, timed, use_engine
+from benchmarks.generate_data import INSERT_BATCH, generate_logs
+
+CSV_COLUMNS = ["id", "ritual_id", "quota_id", "timestamp", "value", "tag", "metric_type"]
+
+
+def optional_int(value: str):
+    return int(value) if value else None
+
+
+def load_csv(engine, text: str):
+    """Parse the CSV export back into typed rows and bulk insert them."""
+    rows = []
+    with Session(engine) as session:
+        for record in csv.DictReader(io.StringIO(text)):
+            rows.append({
+                "ritual_id": optional_int(record["ritual_id"]),
+                "quota_id": optional_int(record["quota_id"]),
+                "timestamp": datetime.fromisoformat(record["timestamp"]),
+                "value": float(record["value"]),
+                "tag": record["tag"] or None,
+                "metric_type": MetricType(record["metric_type"]),
+            })
+            if len(rows) == INSERT_BATCH:
+                session.exec(insert(Log.__table__), params=rows)
+                rows = []
+        if rows:
+            session.exec(insert(Log.__table__), params=rows)
+        rebuild_rollup(session)
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    source, source_path = temp_engine()
+    print(f"Generating {args.rows} logs...")
+    generate_logs(source, args.rows)
+
+    report = {"rows": args.rows}
+    paths = [source_path]
+    try:
+        for format in ("csv", "parquet", "arrow"):
+            results = {}
+            use_engine(app, source)
+            with timed(results, "export_seconds"):
+                response = client.get("/logs/export", params={"format": format})
+            results["bytes"] = len(response.content)
+
+            target, target_path = temp_engine()
+            paths.append(target_path)
+            with timed(results, "import_seconds"):
+                if format == "csv":
+                    load_csv(target, response.text)
+                else:
+                    use_engine(app, target)
+                    imported = client.post("/logs/import", files={"file": (f"logs.{format}", response.content)})
+                    imported.raise_for_status()
+            results["round_trip_seconds"] = round(results["export_seconds"] + results["import_seconds"], 3)
+            report[format] = results
+            print(format, results)
+    finally:
+        app.dependency_overrides.clear()
+        for path in paths:
+            remove_database(path)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
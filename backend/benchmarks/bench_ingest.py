@@ -0,0 +1,121 @@
+"""
+Log write throughput with and without group commit.
+
+Starts a one-worker uvicorn server per variant: direct writes (one
+transaction per POST /logs/) and the LOG_INGEST_QUEUE writer (one
+transaction per batch), each with SQLITE_SYNCHRONOUS=NORMAL and FULL. Many
+concurrent clients then post single logs for a fixed time. Reports writes per
+second, p50/p99 latency and errors, and checks that every acknowledged log
+is in the database afterwards.
+
+Usage: python -m benchmarks.bench_ingest [--clients 64] [--seconds 10] [--synchronous NORMAL FULL]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from sqlmodel import Session, func, select
+
+from benchmarks.bench_workers import start_server
+from benchmarks.common import remove_database, temp_engine
+from models import Log
+
+
+def post_request(port: int, ritual_id: int) -> bytes:
+    body = json.dumps({"ritual_id": ritual_id, "value": 5, "metric_type": "ritual", "tag": "#load"}).encode()
+    head = f"POST /logs/ HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode() + body
+
+
+async def read_status(reader: asyncio.StreamReader) -> int:
+    """Read one response off a keep-alive connection and return its status code."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    length = next(int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:"))
+    await reader.readexactly(length)
+    return int(lines[0].split()[1])
+
+
+async def post_logs(port: int, clients: int, seconds: float) -> dict:
+    """
+    Post single logs from `clients` keep-alive connections for `seconds`.
+    Requests are pre-encoded and responses only parsed for their status, so
+    on a small machine the load generator leaves the CPU to the server.
+    """
+    latencies = []
+    counts = {"acknowledged": 0, "rejected": 0, "errors": 0}
+    stop = time.monotonic() + seconds
+
+    async def client_loop(ritual_id: int):
+        request = post_request(port, ritual_id)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                writer.write(request)
+                status = await read_status(reader)
+                latencies.append(time.perf_counter() - start)
+                if status == 200:
+                    counts["acknowledged"] += 1
+                elif status == 503:
+                    counts["rejected"] += 1
+                else:
+                    counts["errors"] += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client_loop(1 + i % 10) for i in range(clients)))
+
+    latencies.sort()
+    return {
+        **counts,
+        "writes_per_second": round(counts["acknowledged"] / seconds, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64, help="concurrent posting clients")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each run")
+    parser.add_argument("--synchronous", nargs="+", default=["NORMAL", "FULL"], help="SQLITE_SYNCHRONOUS values to compare")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"clients": args.clients, "seconds": args.seconds, "cpus": os.cpu_count(), "runs": {}}
+    for synchronous in args.synchronous:
+        for queue in ("false", "true"):
+            name = f"{'group' if queue == 'true' else 'direct'}/{synchronous}"
+            engine, path = temp_engine()
+            server = start_server(path, 1, args.port, {"LOG_INGEST_QUEUE": queue, "SQLITE_SYNCHRONOUS": synchronous})
+            try:
+                run = asyncio.run(post_logs(args.port, args.clients, args.seconds))
+            finally:
+                server.terminate()
+                server.wait()
+            with Session(engine) as session:
+                run["rows"] = session.exec(select(func.count()).select_from(Log)).one()
+            engine.dispose()
+            remove_database(path)
+            report["runs"][name] = run
+            print(f"{name}: {run}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    # Every acknowledged log must have been committed
+    lost = any(run["rows"] < run["acknowledged"] or run["errors"] for run in report["runs"].values())
+    return 1 if lost else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
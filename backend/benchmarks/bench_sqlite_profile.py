@@ -0,0 +1,71 @@
+"""
+SQLite tuning profile benchmark.
+
+Runs the same log write and read workload against three engine setups:
+the original one (SQL echo on, SQLite default pragmas), default pragmas with
+echo off, and the tuned profile from database.SQLITE_PRAGMAS. Echo output is
+discarded so only its formatting cost is measured, not terminal speed.
+
+Usage: python -m benchmarks.bench_sqlite_profile [--rows 50000] [--writes 500] [--reads 200]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from main import app
+from database import SQLITE_PRAGMAS
+from benchmarks.common import remove_database, temp_engine, timed, use_engine
+from benchmarks.generate_data import generate_logs
+
+PROFILES = {
+    "original": ({}, True),
+    "defaults_no_echo": ({}, False),
+    "tuned": (SQLITE_PRAGMAS, False),
+}
+
+
+def run_profile(client: TestClient, pragmas: dict, echo: bool, args) -> dict:
+    engine, path = temp_engine(pragmas, echo)
+    try:
+        generate_logs(engine, args.rows)
+        use_engine(app, engine)
+        results = {}
+        with timed(results, "write_seconds"):
+            for i in range(args.writes):
+                client.post("/logs/", json={"ritual_id": 1 + i % 11, "value": 15, "metric_type": "ritual", "tag": "#bench"}).raise_for_status()
+        with timed(results, "read_seconds"):
+            for _ in range(args.reads):
+                client.get("/logs/").raise_for_status()
+                client.get("/stats/weekly").raise_for_status()
+        results["writes_per_second"] = round(args.writes / results["write_seconds"], 1)
+        results["reads_per_second"] = round(2 * args.reads / results["read_seconds"], 1)
+        return results
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        remove_database(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000, help="logs to seed before measuring")
+    parser.add_argument("--writes", type=int, default=500, help="POST /logs/ requests")
+    parser.add_argument("--reads", type=int, default=200, help="rounds of GET /logs/ + GET /stats/weekly")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    report = {"rows": args.rows, "writes": args.writes, "reads": args.reads}
+    # Echo binds its log handler to stdout, so keep it silenced for every profile
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, (pragmas, echo) in PROFILES.items():
+            report[name] = run_profile(client, pragmas, echo, args)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Multi-worker load test.
+
+Starts real uvicorn servers with 1, 2, 4... worker processes against one
+seeded SQLite file and hammers them with concurrent readers (GET /logs/ and
+GET /stats/weekly) while writer threads keep posting logs. Reports read
+throughput per worker count and fails if any request errored, e.g. with
+"database is locked".
+
+Read throughput only scales up to the number of CPU cores available.
+
+Usage: python -m benchmarks.bench_workers [--workers 1 2 4] [--rows 50000] [--clients 16] [--writers 2] [--seconds 10]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from benchmarks.common import remove_database, temp_engine
+from benchmarks.generate_data import generate_logs
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(path: str, workers: int, port: int, env: Optional[dict] = None) -> subprocess.Popen:
+    env = dict(os.environ, SQLITE_URL=f"sqlite:///{path}", **(env or {}))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def hammer(base_url: str, clients: int, writers: int, seconds: float) -> dict:
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader():
+        reads = errors = 0
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.monotonic() < stop:
+                for url in ("/logs/", "/stats/weekly"):
+                    reads += 1
+                    errors += client.get(url).status_code >= 500
+        with lock:
+            counts["reads"] += reads
+            counts["errors"] += errors
+
+    def writer(ritual_id: int):
+        writes = errors = 0
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.monotonic() < stop:
+                writes += 1
+                response = client.post("/logs/", json={"ritual_id": ritual_id, "value": 15, "metric_type": "ritual", "tag": "#load"})
+                errors += response.status_code >= 500
+        with lock:
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(clients)]
+    threads += [threading.Thread(target=writer, args=(1 + i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts["reads_per_second"] = round(counts["reads"] / seconds, 1)
+    counts["writes_per_second"] = round(counts["writes"] / seconds, 1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--rows", type=int, default=50_000, help="logs to seed before measuring")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent reader threads")
+    parser.add_argument("--writers", type=int, default=2, help="concurrent writer threads")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"rows": args.rows, "clients": args.clients, "writers": args.writers, "cpus": os.cpu_count(), "runs": {}}
+    for workers in args.workers:
+        engine, path = temp_engine()
+        generate_logs(engine, args.rows)
+        engine.dispose()
+        server = start_server(path, workers, args.port)
+        try:
+            report["runs"][workers] = hammer(f"http://127.0.0.1:{args.port}", args.clients, args.writers, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+            remove_database(path)
+        print(f"{workers} worker(s): {report['runs'][workers]}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    return 1 if any(run["errors"] for run in report["runs"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Shared setup for the backend benchmarks.
+
+Benchmarks run the FastAPI app in-process through TestClient against a
+throwaway SQLite file, so they never touch the real data directory.
+Run them from the backend directory, e.g. `python -m benchmarks.bench_formats`.
+"""
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlmodel import SQLModel
+
+import database
+
+
+def temp_engine(pragmas: dict = database.SQLITE_PRAGMAS, echo: bool = False):
+    """Create an empty database with the full schema in a temporary file."""
+    fd, path = tempfile.mkstemp(prefix="gameoflife-bench-", suffix=".db")
+    os.close(fd)
+    engine = database.make_engine(f"sqlite:///{path}", pragmas, echo)
+    SQLModel.metadata.create_all(engine)
+    return engine, path
+
+
+def remove_database(path: str):
+    """Delete a benchmark database together with its WAL and shared-memory files."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def use_engine(app, engine):
+    """Serve the app's requests from `engine`'s database file, as if it were the configured one."""
+    async_engine = database.make_async_engine(str(engine.url))
+    shard = database.Shard("", engine, async_engine)
+
+    async def current_shard():
+        yield shard
+
+    app.dependency_overrides[database.current_shard] = current_shard
+    return async_engine
+
+
+@contextmanager
+def timed(results: dict, name: str):
+    """Record the wall-clock seconds spent in the block under `results[name]`."""
+    start = time.perf_counter()
+    yield
+    results[name] = round(time.perf_counter() - start, 3)
@@ -0,0 +1,138 @@
+"""
+Synthetic data generator for benchmarks.
+
+Creates rituals, quotas and any number of logs (10k to 10M and beyond)
+spread over several years, then builds the derived tables (daily rollup,
+tag index, ritual streaks) so every endpoint sees a fully populated
+database. The mix roughly follows real use: most logs are ritual minutes
+logged in the daytime, some are quota counts, a few are pomodoro and vice
+entries, and about a third carry one or two tags drawn from a skewed
+vocabulary. A fixed seed gives the same database on every run.
+
+Usage: python -m benchmarks.generate_data --database /tmp/bench.db [--rows 1000000] [--years 5]
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session
+
+import database
+from local_time import local_today
+from models import Log, MetricType, Quota, Ritual
+from rollup import rebuild_rollup
+from streaks import rebuild_streaks
+from tags import rebuild_log_tags
+
+INSERT_BATCH = 50_000
+
+# Share of logs per metric type
+METRIC_MIX = ((MetricType.ritual, 0.80), (MetricType.quota, 0.15), (MetricType.pomodoro, 0.03), (MetricType.vice, 0.02))
+TAGGED_SHARE = 0.3
+# Hour-of-day weights: quiet at night, busiest in the morning and evening
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 10, 9, 8, 7, 7, 7, 7, 8, 9, 10, 10, 9, 7, 5, 3, 2]
+
+
+def tag_vocabulary(size: int):
+    """`size` tag words with Zipf-like weights, so a few tags dominate like in real data."""
+    return [f"#tag{i}" for i in range(size)], [1 / (i + 1) for i in range(size)]
+
+
+def seed_config(session: Session, rituals: int, quotas: int):
+    """Add rituals (every fifth one annual) and quotas."""
+    session.add_all(
+        Ritual(
+            name=f"Ritual {i}",
+            target_value=60 * 52 if i % 5 == 4 else 30 + 30 * (i % 6),
+            unit="mins",
+            period="annual" if i % 5 == 4 else "weekly",
+            sort_order=i,
+        )
+        for i in range(rituals)
+    )
+    session.add_all(Quota(name=f"Quota {i}", unit="count", category="vice", sort_order=i) for i in range(quotas))
+    session.commit()
+
+
+def random_logs(rng: random.Random, count: int, start: datetime, days: int, rituals: int, quotas: int, vocabulary):
+    """Yield `count` log rows as dicts ready for a bulk insert."""
+    metric_types, metric_weights = zip(*METRIC_MIX)
+    words, word_weights = vocabulary
+    kinds = rng.choices(metric_types, metric_weights, k=count)
+    hours = rng.choices(range(24), HOUR_WEIGHTS, k=count)
+    for metric_type, hour in zip(kinds, hours):
+        timestamp = start + timedelta(days=rng.randrange(days), hours=hour, seconds=rng.randrange(3600))
+        tag = None
+        if words and rng.random() < TAGGED_SHARE:
+            tag = " ".join(sorted(set(rng.choices(words, word_weights, k=rng.randint(1, 2)))))
+        row = {"ritual_id": None, "quota_id": None, "timestamp": timestamp, "tag": tag, "metric_type": metric_type}
+        if metric_type == MetricType.ritual:
+            row.update(ritual_id=rng.randint(1, rituals), value=float(rng.choice((5, 10, 15, 20, 30, 45, 60, 90, 120))))
+        elif metric_type == MetricType.quota:
+            row.update(quota_id=rng.randint(1, quotas), value=1.0)
+        elif metric_type == MetricType.pomodoro:
+            row.update(ritual_id=rng.randint(1, rituals), value=25.0)
+        else:
+            row.update(value=1.0)
+        yield row
+
+
+def generate_logs(
+    engine,
+    rows: int,
+    rituals: int = 11,
+    quotas: int = 3,
+    years: int = 3,
+    tags: int = 40,
+    seed: int = 0,
+):
+    """
+    Seed an empty database with rituals, quotas and `rows` logs ending today,
+    then rebuild the rollup, tag index and streaks.
+    """
+    rng = random.Random(seed)
+    days = 365 * years
+    start = datetime.combine(local_today(), datetime.min.time()) - timedelta(days=days - 1)
+    vocabulary = tag_vocabulary(tags)
+
+    with Session(engine) as session:
+        seed_config(session, rituals, quotas)
+        for offset in range(0, rows, INSERT_BATCH):
+            batch = list(random_logs(rng, min(INSERT_BATCH, rows - offset), start, days, rituals, quotas, vocabulary))
+            session.exec(insert(Log.__table__), params=batch)
+        session.commit()
+
+        rebuild_rollup(session)
+        rebuild_log_tags(session)
+        rebuild_streaks(session)
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database", required=True, help="SQLite file to create; must not exist yet")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="logs to generate")
+    parser.add_argument("--rituals", type=int, default=11)
+    parser.add_argument("--quotas", type=int, default=3)
+    parser.add_argument("--years", type=int, default=3, help="logs are spread over this many years up to today")
+    parser.add_argument("--tags", type=int, default=40, help="size of the tag vocabulary (0 for no tags)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f"{args.database} already exists")
+    engine = database.make_engine(f"sqlite:///{os.path.abspath(args.database)}")
+    SQLModel.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    generate_logs(engine, args.rows, args.rituals, args.quotas, args.years, args.tags, args.seed)
+    engine.dispose()
+    print(f"Generated {args.rows} logs in {time.perf_counter() - started:.1f}s: {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+In-process cache for read endpoints whose data changes only on edits.
+
+Entries live in a namespace ("rituals", "quotas", "rewards", "settings",
+"stats"). Read routes are wrapped in `cached(namespace)`; write routes are
+wrapped in `invalidates(*namespaces)`, which evicts those namespaces after
+the write succeeds. Every entry also expires after CACHE_TTL_SECONDS. A TTL
+of 0 turns the cache off.
+
+The same namespaces key the data-version counters behind the ETags (see
+versions.py). Each entry remembers the namespace's data version it was
+built from and is only served while the database still holds that version,
+so a write made by another worker process is seen on the next read rather
+than after the TTL. In multi-user mode entries and invalidations are scoped
+to the request's shard, so one user's writes never evict another's entries.
+
+Values are stored JSON-encoded, so cached responses never hold on to ORM
+objects from a closed session.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from database import current_shard_key
+from live import notify_stats
+from versions import current_versions, data_versions, make_etag, read_data_versions, track_writes, untrack_writes
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: Dict[Tuple[str, str, Hashable], Tuple[float, Hashable, Any]] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions: Dict[str, int] = {}
+        # Bumped on every invalidation, so a load that raced a write is not stored
+        self.generations: Dict[Tuple[str, str], int] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, namespace: str, key: Hashable, scope: str = "", version: Hashable = None) -> Tuple[bool, Any, Tuple[float, int]]:
+        """
+        Return (hit, value, token). Only an entry stored under `version` is a
+        hit. On a miss, pass `token` back to `store` together with the freshly
+        loaded value.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((namespace, scope, key))
+            if entry and entry[0] > now and entry[1] == version:
+                self.hits[namespace] = self.hits.get(namespace, 0) + 1
+                return True, entry[2], None
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return False, None, (now, self.generations.get((namespace, scope), 0))
+
+    def store(self, namespace: str, key: Hashable, value: Any, token: Tuple[float, int], scope: str = "", version: Hashable = None):
+        loaded_at, generation = token
+        with self.lock:
+            if self.generations.get((namespace, scope), 0) == generation:
+                self.entries[(namespace, scope, key)] = (loaded_at + self.ttl, version, value)
+
+    def get_or_load(self, namespace: str, key: Hashable, load: Callable[[], Any], scope: str = "", version: Hashable = None) -> Any:
+        """
+        Return the value cached for (namespace, key) under `version`, calling
+        `load` on a miss, an expiry or a newer version.
+        """
+        if self.ttl <= 0:
+            return load()
+        hit, value, token = self.lookup(namespace, key, scope, version)
+        if not hit:
+            # Load outside the lock so a slow query does not block other namespaces
+            value = load()
+            self.store(namespace, key, value, token, scope, version)
+        return value
+
+    async def get_or_load_async(self, namespace: str, key: Hashable, load: Callable[[], Awaitable[Any]], scope: str = "", version: Hashable = None) -> Any:
+        """`get_or_load` for a coroutine loader."""
+        if self.ttl <= 0:
+            return await load()
+        hit, value, token = self.lookup(namespace, key, scope, version)
+        if not hit:
+            value = await load()
+            self.store(namespace, key, value, token, scope, version)
+        return value
+
+    def invalidate(self, *namespaces: str, scope: str = ""):
+        with self.lock:
+            for entry_key in [k for k in self.entries if k[0] in namespaces and k[1] == scope]:
+                del self.entries[entry_key]
+            for namespace in namespaces:
+                self.generations[(namespace, scope)] = self.generations.get((namespace, scope), 0) + 1
+                self.evictions[namespace] = self.evictions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            namespaces = sorted(set(self.hits) | set(self.misses) | set(self.evictions))
+            return {
+                "ttl_seconds": self.ttl,
+                "entries": len(self.entries),
+                "namespaces": {
+                    name: {
+                        "hits": self.hits.get(name, 0),
+                        "misses": self.misses.get(name, 0),
+                        "evictions": self.evictions.get(name, 0),
+                    }
+                    for name in namespaces
+                },
+            }
+
+
+cache = TTLCache(CACHE_TTL_SECONDS)
+
+
+def cached(namespace: str):
+    """
+    Cache a read route's JSON response, keyed by its arguments other than the
+    session. An entry is served only under the namespace's data version it
+    was built from: the one `conditional` read for the ETag, or else one
+    primary-key lookup on the route's session.
+    """
+    def decorator(route):
+        def make_key(args, kwargs):
+            return (route.__name__, args, tuple(sorted((k, v) for k, v in kwargs.items() if k != "session")))
+
+        def etag_version():
+            # The namespace's part of the request's ETag, which for stats also names the day
+            versions = current_versions.get()
+            if versions and namespace in versions:
+                return make_etag({namespace: versions[namespace]})
+            return None
+
+        if inspect.iscoroutinefunction(route):
+            @functools.wraps(route)
+            async def async_wrapper(*args, **kwargs):
+                async def load():
+                    return jsonable_encoder(await route(*args, **kwargs))
+                version = None
+                if cache.ttl > 0:
+                    version = etag_version() or make_etag(await data_versions(kwargs["session"], [namespace]))
+                return await cache.get_or_load_async(namespace, make_key(args, kwargs), load, current_shard_key.get(), version)
+            return async_wrapper
+
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            version = None
+            if cache.ttl > 0:
+                version = etag_version() or make_etag(read_data_versions(kwargs["session"], [namespace]))
+            return cache.get_or_load(
+                namespace, make_key(args, kwargs), lambda: jsonable_encoder(route(*args, **kwargs)), current_shard_key.get(), version)
+        return wrapper
+    return decorator
+
+
+def evict(namespaces: Iterable[str], shard_key: str):
+    """Drop `namespaces` from the cache of shard `shard_key`; stats changes also wake its live stream."""
+    cache.invalidate(*namespaces, scope=shard_key)
+    if "stats" in namespaces:
+        notify_stats(shard_key)
+
+
+def invalidates(*namespaces: str):
+    """
+    Mark a write route as changing `namespaces`: their data versions are
+    bumped in the route's transaction and the cache evicts them once the
+    route has returned successfully. Stats writes also wake the live stream.
+    """
+    def done():
+        evict(namespaces, current_shard_key.get())
+
+    def decorator(route):
+        if inspect.iscoroutinefunction(route):
+            @functools.wraps(route)
+            async def async_wrapper(*args, **kwargs):
+                session = kwargs.get("session")
+                if session is not None:
+                    track_writes(session, namespaces)
+                try:
+                    result = await route(*args, **kwargs)
+                finally:
+                    if session is not None:
+                        untrack_writes(session)
+                done()
+                return result
+            return async_wrapper
+
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            session = kwargs.get("session")
+            if session is not None:
+                track_writes(session, namespaces)
+            try:
+                result = route(*args, **kwargs)
+            finally:
+                if session is not None:
+                    untrack_writes(session)
+            done()
+            return result
+        return wrapper
+    return decorator
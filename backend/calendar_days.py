@@ -0,0 +1,43 @@
+"""
+The calendar table.
+
+`calendar_day` maps every date to its week (Monday), month and year and its
+ISO week, so the stats queries bucket rollup days by joining on it by
+primary key instead of calling SQLite date functions on every row. Dates
+are local dates (see local_time.py), so the buckets are local weeks and
+months. The table is filled from CALENDAR_FIRST to CALENDAR_LAST when it is
+created (by the migration, or by create_all through a hook in models.py),
+and `cover_days` extends it when a log falls outside that range.
+"""
+
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from archive import all_logs
+from local_time import CALENDAR_FIRST, CALENDAR_LAST, calendar_rows
+from models import CalendarDay
+
+
+def fill_calendar(connection, first: date = CALENDAR_FIRST, last: date = CALENDAR_LAST):
+    """Add the dates from `first` to `last` that are not in calendar_day yet."""
+    stmt = insert(CalendarDay.__table__).on_conflict_do_nothing(index_elements=["day"])
+    connection.execute(stmt, list(calendar_rows(first, last)))
+
+
+def cover_days(session: Session, days: Iterable[date]):
+    """Make sure calendar_day has a row for each of `days`; a no-op inside the prefilled range."""
+    outside = [day for day in days if day < CALENDAR_FIRST or day > CALENDAR_LAST]
+    if outside:
+        fill_calendar(session.connection(), min(outside), max(outside))
+
+
+def cover_logs(session: Session):
+    """`cover_days` for the oldest and newest log, archived or not, before rebuilding tables from them."""
+    logs = all_logs(session)
+    first, last = session.exec(select(func.min(logs.c.timestamp), func.max(logs.c.timestamp))).one()
+    if first is not None:
+        cover_days(session, [first.date(), last.date()])
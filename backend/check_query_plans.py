@@ -0,0 +1,121 @@
+"""
+Query plan check for the hot log queries.
+
+Builds the schema in an in-memory SQLite database, runs EXPLAIN QUERY PLAN on
+the statements the stats and log routes issue, and fails if any of them
+falls back to a full table scan instead of the expected index.
+
+Usage: python check_query_plans.py
+"""
+
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel, select, tuple_
+
+from models import Log, LogTag, MetricType
+from aggregation import period_totals_statement, range_series_statement
+
+# SQLite's name for the index backing log_tag's (tag, log_id) primary key
+LOG_TAG_KEY = "sqlite_autoindex_log_tag_1"
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    return [row[-1] for row in rows]
+
+
+def plan_uses(plan, table, indexes):
+    """Every access to `table` must go through an index or its primary key, and all of `indexes` must be used."""
+    steps = [step for step in plan if step.split()[:2] in (["SCAN", table], ["SEARCH", table])]
+    if not steps or any("INDEX" not in step and "PRIMARY KEY" not in step for step in steps):
+        return False
+    return all(any(index in step for step in steps) for index in indexes)
+
+
+def main() -> int:
+    start = datetime(2026, 1, 1)
+    checks = [
+        (
+            "weekly/monthly stats totals",
+            period_totals_statement(start, ritual_ids=[1, 2, 3], quota_ids=[1, 2]),
+            "log_daily_rollup",
+            ["ix_log_daily_rollup_ritual", "ix_log_daily_rollup_quota"],
+        ),
+        (
+            "yearly stats totals with monthly activity",
+            period_totals_statement(start, ritual_ids=[1, 2, 3], quota_ids=[1, 2], by_month=True, activity=True),
+            "log_daily_rollup",
+            ["ix_log_daily_rollup_ritual", "ix_log_daily_rollup_quota", "ix_log_daily_rollup_day"],
+        ),
+        (
+            "range stats, weekly buckets",
+            range_series_statement(date(2023, 1, 1), date(2026, 1, 1), "week", ritual_ids=[1, 2, 3], quota_ids=[1, 2]),
+            "log_daily_rollup",
+            ["ix_log_daily_rollup_ritual", "ix_log_daily_rollup_quota"],
+        ),
+        (
+            "range stats, calendar lookup per rollup day",
+            range_series_statement(date(2023, 1, 1), date(2026, 1, 1), "month", ritual_ids=[1, 2, 3], quota_ids=[1, 2]),
+            "calendar_day",
+            ["PRIMARY KEY"],
+        ),
+        (
+            "log listing",
+            select(Log).order_by(Log.timestamp.desc(), Log.id.desc()).limit(101),
+            "log",
+            ["ix_log_timestamp"],
+        ),
+        (
+            "log listing, keyset page in a date range",
+            select(Log)
+            .where(Log.timestamp >= start, Log.timestamp < datetime(2026, 2, 1))
+            .where(tuple_(Log.timestamp, Log.id) < (datetime(2026, 1, 20), 500))
+            .order_by(Log.timestamp.desc(), Log.id.desc())
+            .limit(101),
+            "log",
+            ["ix_log_timestamp"],
+        ),
+        (
+            "log listing for one ritual",
+            select(Log)
+            .where(Log.ritual_id == 1, Log.metric_type == MetricType.ritual)
+            .order_by(Log.timestamp.desc(), Log.id.desc())
+            .limit(101),
+            "log",
+            ["ix_log_ritual_metric_timestamp"],
+        ),
+        (
+            "tag autocomplete",
+            select(LogTag.tag).distinct().order_by(LogTag.tag),
+            "log_tag",
+            [LOG_TAG_KEY],
+        ),
+        (
+            "logs by tag",
+            select(LogTag.log_id).where(LogTag.tag == "#gym"),
+            "log_tag",
+            [LOG_TAG_KEY],
+        ),
+    ]
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+
+    failures = 0
+    with engine.connect() as connection:
+        for name, statement, table, indexes in checks:
+            plan = explain(connection, statement)
+            ok = plan_uses(plan, table, indexes)
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {name}")
+            for step in plan:
+                print(f"       {step}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
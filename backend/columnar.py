@@ -0,0 +1,239 @@
+"""
+Columnar (Parquet / Arrow IPC) export and import of logs.
+
+Unlike the CSV export, columns keep their types across a round trip:
+integer ids, microsecond timestamps, float values and a dictionary-encoded
+metric_type. Both directions work in batches, so memory stays bounded by the
+batch size rather than the size of the history.
+"""
+
+from typing import BinaryIO, Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlmodel import Session, select
+
+from archive import ARCHIVE_LOG, open_archive, with_archive
+from models import Log, MetricType
+from rollup import add_delta, apply_deltas
+
+BATCH_SIZE = 50_000
+
+METRIC_TYPES = pa.array([m.value for m in MetricType])
+
+LOG_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("ritual_id", pa.int64()),
+    ("quota_id", pa.int64()),
+    ("timestamp", pa.timestamp("us")),
+    ("value", pa.float64()),
+    ("tag", pa.string()),
+    ("metric_type", pa.dictionary(pa.int8(), pa.string())),
+])
+
+# SQLAlchemy's storage format for DateTime on SQLite; Arrow's %S includes the microseconds
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns an imported file must have; the rest default to null
+REQUIRED_COLUMNS = {"timestamp", "value", "metric_type"}
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "logs.parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "logs.arrow"),
+}
+
+
+class _StreamSink:
+    """Write-only file object whose bytes are handed to the response as they are written."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet records absolute offsets in its footer, so this must keep
+        # counting across drains
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _to_batch(rows) -> pa.RecordBatch:
+    ids, ritual_ids, quota_ids, timestamps, values, tags, metric_types = zip(*rows)
+    metric_index = {m: i for i, m in enumerate(MetricType)}
+    return pa.record_batch(
+        [
+            pa.array(ids, pa.int64()),
+            pa.array(ritual_ids, pa.int64()),
+            pa.array(quota_ids, pa.int64()),
+            pa.array(timestamps, pa.timestamp("us")),
+            pa.array(values, pa.float64()),
+            pa.array(tags, pa.string()),
+            pa.DictionaryArray.from_arrays(
+                pa.array([metric_index[MetricType(m)] for m in metric_types], pa.int8()), METRIC_TYPES
+            ),
+        ],
+        schema=LOG_SCHEMA,
+    )
+
+
+def stream_logs(bind, filters: list, format: str) -> Iterator[bytes]:
+    """Yield a Parquet file or Arrow IPC stream of the matching logs, one batch at a time."""
+    query = (
+        select(*(getattr(Log, name) for name in LOG_SCHEMA.names))
+        .where(*filters)
+    )
+
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, LOG_SCHEMA) if format == "parquet" else ipc.new_stream(sink, LOG_SCHEMA)
+    with Session(bind) as session:
+        query = with_archive(query, open_archive(session))
+        query = query.order_by(query.selected_columns.id).execution_options(yield_per=BATCH_SIZE)
+        for chunk in session.exec(query).partitions():
+            writer.write_batch(_to_batch(chunk))
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def read_batches(source: BinaryIO) -> Iterator[pa.RecordBatch]:
+    """Read record batches from a Parquet file, Arrow IPC file or Arrow IPC stream."""
+    magic = source.read(6)
+    source.seek(0)
+    if magic[:4] == b"PAR1":
+        yield from pq.ParquetFile(source).iter_batches(batch_size=BATCH_SIZE)
+    elif magic == b"ARROW1":
+        reader = ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        yield from ipc.open_stream(source)
+
+
+def _normalize(batch: pa.RecordBatch, first_id: Optional[int]) -> pa.Table:
+    """
+    Cast an incoming batch to the log column types, dropping unknown columns.
+    Ids are numbered from `first_id`, or taken from the file when it is None.
+    """
+    missing = REQUIRED_COLUMNS - set(batch.schema.names)
+    if first_id is None and "id" not in batch.schema.names:
+        missing.add("id")
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+    columns = {}
+    for field in LOG_SCHEMA:
+        if field.name == "id" and first_id is not None:
+            columns["id"] = pa.array(range(first_id, first_id + batch.num_rows), pa.int64())
+        elif field.name in batch.schema.names:
+            target = pa.string() if field.name == "metric_type" else field.type
+            columns[field.name] = pc.cast(batch.column(field.name), target)
+        else:
+            columns[field.name] = pa.nulls(batch.num_rows, field.type)
+
+    if not pc.all(pc.is_in(columns["metric_type"], value_set=METRIC_TYPES)).as_py():
+        raise ValueError("Unknown metric_type in import")
+    return pa.table(columns)
+
+
+def _add_table_deltas(deltas: dict, table: pa.Table):
+    """Fold an imported table into rollup deltas with a vectorized group-by."""
+    keys = pa.table({
+        "metric_type": table.column("metric_type"),
+        "ritual_id": pc.fill_null(table.column("ritual_id"), 0),
+        "quota_id": pc.fill_null(table.column("quota_id"), 0),
+        "day": pc.cast(table.column("timestamp"), pa.date32()),
+        "value": table.column("value"),
+    })
+    grouped = keys.group_by(["metric_type", "ritual_id", "quota_id", "day"]).aggregate(
+        [("value", "sum"), ("value", "count")]
+    )
+    for row in grouped.to_pylist():
+        add_delta(deltas, row["metric_type"], row["ritual_id"], row["quota_id"], row["day"], row["value_sum"], row["value_count"])
+
+
+def _insert_tags(session: Session, table: pa.Table):
+    """Index the imported tag strings, split and de-duplicated per log by Arrow."""
+    words = pc.utf8_split_whitespace(table.column("tag"))
+    pairs = pa.table({
+        "tag": pc.list_flatten(words),
+        "log_id": pc.take(table.column("id"), pc.list_parent_indices(words)),
+    })
+    pairs = pairs.filter(pc.not_equal(pairs.column("tag"), "")).group_by(["tag", "log_id"]).aggregate([])
+    if pairs.num_rows:
+        rows = list(zip(pairs.column("tag").to_pylist(), pairs.column("log_id").to_pylist()))
+        session.connection().exec_driver_sql("INSERT INTO log_tag (tag, log_id) VALUES (?, ?)", rows)
+
+
+def _insert_table(session: Session, table: pa.Table):
+    """
+    Insert a normalized table with one driver-level executemany.
+    Timestamps are formatted by Arrow in bulk, so no per-row bind processing is needed.
+    """
+    stored = table.set_column(
+        table.schema.get_field_index("timestamp"),
+        "timestamp",
+        pc.strftime(table.column("timestamp"), SQLITE_DATETIME_FORMAT),
+    )
+    names = stored.schema.names
+    sql = f"INSERT INTO log ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})"
+    rows = list(zip(*(stored.column(name).to_pylist() for name in names)))
+    session.connection().exec_driver_sql(sql, rows)
+
+
+def import_logs(session: Session, source: BinaryIO, keep_ids: bool = False) -> int:
+    """
+    Bulk insert logs from a columnar file with one executemany per batch.
+    Ids are reassigned after the highest id ever used unless `keep_ids` is
+    set. Returns the number of rows imported.
+    """
+    deltas = {}
+    imported = 0
+    # AUTOINCREMENT's counter also covers archived and deleted logs
+    used = session.connection().exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'log'").scalar()
+    next_id = None if keep_ids else (used or 0) + 1
+    low = high = None
+    for batch in read_batches(source):
+        table = _normalize(batch, next_id)
+        if table.num_rows == 0:
+            continue
+        _insert_table(session, table)
+        _insert_tags(session, table)
+        _add_table_deltas(deltas, table)
+        imported += table.num_rows
+        if next_id is not None:
+            next_id += table.num_rows
+        else:
+            bounds = pc.min_max(table.column("id")).as_py()
+            low = bounds["min"] if low is None else min(low, bounds["min"])
+            high = bounds["max"] if high is None else max(high, bounds["max"])
+
+    # The primary key only guards against clashes with the hot logs
+    cutoff = open_archive(session) if low is not None else None
+    if cutoff and session.exec(
+        select(ARCHIVE_LOG.c.id)
+        .join(Log, Log.id == ARCHIVE_LOG.c.id)
+        .where(Log.id.between(low, high), ARCHIVE_LOG.c.timestamp < cutoff)
+        .limit(1)
+    ).first():
+        raise ValueError("Imported ids clash with archived logs")
+
+    apply_deltas(session, deltas)
+    return imported
@@ -1,18 +1,348 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Depends, HTTPException, Request
+from typing import Dict, List, Optional
+import asyncio
+import functools
+import inspect
 import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+sqlite_url = os.getenv("SQLITE_URL", "sqlite:////app/data/gameoflife.db")
+sqlite_file_name = make_url(sqlite_url).database
 
 # Ensure data directory exists
-os.makedirs("/app/data", exist_ok=True)
+if sqlite_file_name and sqlite_file_name != ":memory:":
+    os.makedirs(os.path.dirname(os.path.abspath(sqlite_file_name)), exist_ok=True)
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+# Production tuning profile, applied to every new connection. Each pragma
+# can be overridden through its environment variable.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative means KiB, i.e. 64 MiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+def pool_args(url: str, pool: Optional[dict] = None) -> dict:
+    if make_url(url).database in (None, "", ":memory:"):
+        return {}
+    return pool or {
+        "pool_size": int(os.getenv("SQLITE_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("SQLITE_MAX_OVERFLOW", "10")),
+    }
+
+def apply_pragmas(sync_engine, pragmas: dict):
+    """Run `pragmas` on every new DBAPI connection of `sync_engine`."""
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-sqlite_file_name = "/app/data/gameoflife.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+def make_engine(url: str, pragmas: dict = SQLITE_PRAGMAS, echo: bool = False, pool: Optional[dict] = None):
+    """Create a SQLite engine that applies `pragmas` through a connect hook."""
+    new_engine = create_engine(url, echo=echo, connect_args={"check_same_thread": False}, **pool_args(url, pool))
+    apply_pragmas(new_engine, pragmas)
+    return new_engine
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+def make_async_engine(url: str, pragmas: dict = SQLITE_PRAGMAS, echo: bool = False, pool: Optional[dict] = None):
+    """Create an aiosqlite engine for the same database file as `url`, with the same pragmas."""
+    async_url = make_url(url).set(drivername="sqlite+aiosqlite")
+    new_engine = create_async_engine(async_url, echo=echo, **pool_args(url, pool))
+    apply_pragmas(new_engine.sync_engine, pragmas)
+    return new_engine
+
+engine = make_engine(sqlite_url, echo=env_flag("SQLITE_ECHO"))
+async_engine = make_async_engine(sqlite_url, echo=env_flag("SQLITE_ECHO"))
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
-def get_session():
-    with Session(engine) as session:
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+MIGRATE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrate.py")
+
+def schema_revision(path: str) -> Optional[str]:
+    """The alembic revision stored in the database file at `path`, if any."""
+    if not os.path.exists(path):
+        return None
+    connection = sqlite3.connect(path)
+    try:
+        row = connection.execute("SELECT version_num FROM alembic_version").fetchone()
+        return row[0] if row else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        connection.close()
+
+def migrate_file(path: str):
+    """
+    Bring the database file at `path` (created if missing) to the head
+    revision. Runs migrate.py in a separate process, so alembic's logging
+    setup stays out of the server; raises RuntimeError when it fails.
+    """
+    if schema_revision(path) == ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head():
+        return
+    result = subprocess.run(
+        [sys.executable, MIGRATE_SCRIPT],
+        env={**os.environ, "SQLITE_URL": f"sqlite:///{os.path.abspath(path)}"},
+        cwd=os.path.dirname(MIGRATE_SCRIPT),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Migrating {path} failed: {result.stderr.strip().splitlines()[-1:]}")
+
+# Multi-user mode. With SHARD_DIR set, every request names its user in the
+# USER_HEADER header (set by the authenticating proxy) and is served from
+# that user's own SQLite file, SHARD_DIR/<user>.db, so users never contend
+# on one write lock. Without it the app serves the single database above.
+SHARD_DIR = os.getenv("SHARD_DIR", "")
+USER_HEADER = os.getenv("USER_HEADER", "X-User")
+# Shards with open engines; the least recently used idle one is closed beyond this
+SHARD_CACHE_SIZE = int(os.getenv("SHARD_CACHE_SIZE", "64"))
+# Shards unused for this long are closed even below the limit
+SHARD_IDLE_SECONDS = float(os.getenv("SHARD_IDLE_SECONDS", "600"))
+# Per-shard pools stay small: one user rarely has many requests in flight
+SHARD_POOL = {
+    "pool_size": int(os.getenv("SHARD_POOL_SIZE", "2")),
+    "max_overflow": int(os.getenv("SHARD_MAX_OVERFLOW", "3")),
+}
+USER_ID = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+
+# Key of the shard serving the current request ("" in single-user mode);
+# the cache, ETags and the live stream are scoped by it
+current_shard_key: ContextVar[str] = ContextVar("current_shard_key", default="")
+
+class Shard:
+    """The sync and async engines of one database, with a count of requests using them."""
+
+    def __init__(self, key: str, engine, async_engine):
+        self.key = key
+        self.engine = engine
+        self.async_engine = async_engine
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.active += 1
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            self.last_used = time.monotonic()
+
+    async def dispose(self):
+        self.engine.dispose()
+        await self.async_engine.dispose()
+
+class ShardRegistry:
+    """
+    LRU cache of open shard engines. A shard is migrated to head the first
+    time this process opens it, and its engines are closed once it is idle
+    for SHARD_IDLE_SECONDS or is the least recently used beyond
+    SHARD_CACHE_SIZE. Shards serving a request or a live stream are never closed.
+    """
+
+    def __init__(self, directory: str, size: int, idle_seconds: float):
+        self.directory = directory
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.shards: "OrderedDict[str, Shard]" = OrderedDict()
+        self.opening: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def path(self, user: str) -> str:
+        return os.path.join(self.directory, f"{user}.db")
+
+    def users(self) -> List[str]:
+        """Every user with a shard file, open in this process or not."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db") and USER_ID.match(name[:-3]))
+
+    @contextmanager
+    def engine(self, user: str):
+        """
+        A sync engine of `user`'s existing shard, for maintenance jobs that
+        run outside a request; disposed on exit.
+        """
+        path = self.path(user)
+        if not USER_ID.match(user) or not os.path.exists(path):
+            raise FileNotFoundError(f"No shard for user {user}")
+        shard_engine = make_engine(f"sqlite:///{os.path.abspath(path)}")
+        try:
+            yield shard_engine
+        finally:
+            shard_engine.dispose()
+
+    def lookup(self, user: str) -> Optional[Shard]:
+        """The open shard of `user`, acquired, or None."""
+        with self.lock:
+            shard = self.shards.get(user)
+            if shard is not None:
+                self.shards.move_to_end(user)
+                shard.acquire()
+            return shard
+
+    def open(self, user: str) -> Shard:
+        """Migrate and open the shard of `user`; returned acquired."""
+        with self.lock:
+            opening = self.opening.setdefault(user, threading.Lock())
+        # Concurrent first requests for one user migrate and connect once
+        with opening:
+            shard = self.lookup(user)
+            if shard is not None:
+                return shard
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(user)
+            migrate_file(path)
+            url = f"sqlite:///{os.path.abspath(path)}"
+            shard = Shard(user, make_engine(url, pool=SHARD_POOL), make_async_engine(url, pool=SHARD_POOL))
+            shard.acquire()
+            with self.lock:
+                self.shards[user] = shard
+                self.opening.pop(user, None)
+            return shard
+
+    def expired(self) -> List[Shard]:
+        """Remove and return idle shards beyond the size limit or idle timeout."""
+        now = time.monotonic()
+        with self.lock:
+            idle = [shard for shard in self.shards.values() if shard.active == 0]
+            # Oldest first, as the dict is kept in recency order
+            excess = len(self.shards) - self.size
+            expired = [shard for i, shard in enumerate(idle) if i < excess or now - shard.last_used > self.idle_seconds]
+            for shard in expired:
+                del self.shards[shard.key]
+        return expired
+
+    async def get(self, user: str) -> Shard:
+        """The shard of `user`, acquired; the caller must release it."""
+        shard = self.lookup(user)
+        if shard is None:
+            try:
+                shard = await asyncio.to_thread(self.open, user)
+            except RuntimeError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+        for old in self.expired():
+            await old.dispose()
+        return shard
+
+    async def dispose_all(self):
+        with self.lock:
+            shards, self.shards = list(self.shards.values()), OrderedDict()
+        for shard in shards:
+            await shard.dispose()
+
+default_shard = Shard("", engine, async_engine)
+shards = ShardRegistry(SHARD_DIR, SHARD_CACHE_SIZE, SHARD_IDLE_SECONDS)
+
+async def current_shard(request: Request):
+    """Dependency resolving the database of the request's user."""
+    if not SHARD_DIR:
+        yield default_shard
+        return
+    user = request.headers.get(USER_HEADER)
+    if not user:
+        raise HTTPException(status_code=401, detail=f"Missing {USER_HEADER} header")
+    if not USER_ID.match(user):
+        raise HTTPException(status_code=400, detail=f"Invalid {USER_HEADER} header")
+    shard = await shards.get(user)
+    current_shard_key.set(shard.key)
+    try:
+        yield shard
+    finally:
+        shard.release()
+
+def get_session(shard: Shard = Depends(current_shard)):
+    with Session(shard.engine) as session:
+        yield session
+
+async def get_async_session(shard: Shard = Depends(current_shard)):
+    # Attributes stay loaded after commit, so responses can be built without
+    # an implicit (and, under asyncio, forbidden) lazy refresh
+    async with AsyncSession(shard.async_engine, expire_on_commit=False) as session:
         yield session
+
+async def begin_read(session: AsyncSession):
+    """
+    Pin the rest of `session`'s reads to one snapshot of the database.
+    pysqlite only opens a transaction before a write, so without this every
+    SELECT sees whatever was committed at that moment; in WAL mode a reader
+    never blocks writers, and the snapshot ends when the session closes.
+    """
+    await session.execute(text("BEGIN"))
+
+# Write retries for multi-worker deployments. busy_timeout already makes
+# SQLite wait for the write lock, but a transaction that read before writing
+# can still fail straight away when another worker committed in between.
+BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "5"))
+BUSY_BACKOFF = 0.05
+
+def is_busy_error(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database table is locked" in message or "busy" in message
+
+def busy_delay(attempt: int) -> float:
+    # Jittered exponential backoff so competing workers spread out
+    return BUSY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+def retry_on_busy(route):
+    """
+    Re-run a write route when SQLite reports the database as locked.
+    The route's `session` is rolled back between attempts, so each attempt
+    starts a fresh transaction; the last error is re-raised once retries run out.
+    Works for both sync and async routes.
+    """
+    if inspect.iscoroutinefunction(route):
+        @functools.wraps(route)
+        async def async_wrapper(*args, **kwargs):
+            session = kwargs.get("session")
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    return await route(*args, **kwargs)
+                except OperationalError as e:
+                    if attempt == BUSY_RETRIES or not is_busy_error(e):
+                        raise
+                    if session is not None:
+                        await session.rollback()
+                    await asyncio.sleep(busy_delay(attempt))
+        return async_wrapper
+
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        session = kwargs.get("session")
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return route(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == BUSY_RETRIES or not is_busy_error(e):
+                    raise
+                if session is not None:
+                    session.rollback()
+                time.sleep(busy_delay(attempt))
+    return wrapper
@@ -0,0 +1,32 @@
+"""
+Log import script for Game of Life application.
+Bulk loads a Parquet or Arrow file, as written by
+/logs/export?format=parquet or ?format=arrow, into the log table and
+updates the daily rollup in the same transaction.
+
+Usage: python import_logs.py <file> [--keep-ids]
+"""
+
+import argparse
+from sqlmodel import Session
+from database import engine, create_db_and_tables
+import columnar
+from versions import bump_data_versions
+
+def main():
+    parser = argparse.ArgumentParser(description="Import logs from a Parquet or Arrow file")
+    parser.add_argument("file", help="Parquet file, Arrow IPC file or Arrow IPC stream")
+    parser.add_argument("--keep-ids", action="store_true", help="Keep the ids from the file instead of assigning new ones")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+
+    with open(args.file, "rb") as source, Session(engine) as session:
+        print(f"Importing logs from {args.file}...")
+        imported = columnar.import_logs(session, source, args.keep_ids)
+        bump_data_versions(session, ["logs", "stats"])
+        session.commit()
+        print(f"✅ Imported {imported} logs")
+
+if __name__ == "__main__":
+    main()
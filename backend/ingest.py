@@ -0,0 +1,146 @@
+"""
+Group commit for POST /logs/.
+
+Every log write normally runs its own transaction, so a burst of single-log
+posts (grid saves, scripted imports, timer integrations) pays one commit,
+and with SQLITE_SYNCHRONOUS=FULL one fsync, per log. With LOG_INGEST_QUEUE
+enabled the route instead hands the new log to its shard's writer: a queue
+drained by a single task, which waits up to LOG_INGEST_DELAY_MS for more logs
+(or until LOG_INGEST_BATCH are waiting) and writes the batch, its rollup and
+tag rows and one data-version bump in one transaction.
+
+A request is answered only after the transaction holding its log has
+committed, so an acknowledged log is as durable as with the direct write.
+If a batch fails for a reason other than a busy database, its logs are
+retried one transaction each, so a bad log only fails its own request.
+The queue holds at most LOG_INGEST_QUEUE_SIZE logs; beyond that the route
+answers 503 with Retry-After instead of piling up requests.
+
+Writers are per worker process, shard (see database.py) and event loop;
+a writer's task ends when its queue is empty and the next log starts it again.
+A running task keeps its shard acquired, as a live stream does, so the
+shard registry never closes that engine while logs are still queued for it.
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import BUSY_RETRIES, Shard, busy_delay, env_flag, is_busy_error
+from metrics import current_request
+from models import Log
+from rollup import add_log_delta, apply_deltas
+from tags import add_log_tags
+from versions import track_writes
+
+INGEST_QUEUE = env_flag("LOG_INGEST_QUEUE")
+INGEST_BATCH = int(os.getenv("LOG_INGEST_BATCH", "256"))
+INGEST_DELAY = float(os.getenv("LOG_INGEST_DELAY_MS", "5")) / 1000
+INGEST_QUEUE_SIZE = int(os.getenv("LOG_INGEST_QUEUE_SIZE", "4096"))
+
+INGEST_NAMESPACES = ("stats", "logs")
+
+
+class QueueFull(Exception):
+    """The writer's queue is at LOG_INGEST_QUEUE_SIZE."""
+
+
+class LogWriter:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self.shard: Optional[Shard] = None
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        # State is bound to one event loop; a new loop (e.g. a test client) starts over
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self.batch_ready = asyncio.Event()
+        self.task = None
+
+    async def submit(self, shard: Shard, log: Log) -> Log:
+        """Queue `log` for the next batch and return it once that batch has committed."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self._reset(loop)
+        future = loop.create_future()
+        try:
+            # Values rather than the object: a retried batch builds fresh rows
+            self.queue.put_nowait((log.model_dump(exclude={"id"}), future))
+        except asyncio.QueueFull:
+            raise QueueFull()
+        if self.queue.qsize() >= INGEST_BATCH:
+            self.batch_ready.set()
+        if self.task is None or self.task.done():
+            # Released when the task ends; queued logs can outlive their (cancelled) requests
+            shard.acquire()
+            self.shard = shard
+            self.task = loop.create_task(self._run())
+        # Shielded: a client that disconnects does not take its log out of the batch
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        # The task inherited the first submitter's context; its statements are not that request's
+        current_request.set(None)
+        try:
+            # Ends without awaiting once the queue is empty, so `submit` never sees
+            # a live task that will not pick up its log
+            while not self.queue.empty():
+                if self.queue.qsize() < INGEST_BATCH:
+                    try:
+                        await asyncio.wait_for(self.batch_ready.wait(), INGEST_DELAY)
+                    except asyncio.TimeoutError:
+                        pass
+                self.batch_ready.clear()
+                batch = [self.queue.get_nowait() for _ in range(min(INGEST_BATCH, self.queue.qsize()))]
+                await self._write(batch)
+        finally:
+            self.shard.release()
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            logs = await self._commit([values for values, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            for item in batch:
+                await self._write([item])
+            return
+        for log, (_, future) in zip(logs, batch):
+            if not future.done():
+                future.set_result(log)
+
+    async def _commit(self, rows: List[dict]) -> List[Log]:
+        """Insert `rows` with their rollup and tag rows in one transaction, retrying while the database is busy."""
+        for attempt in range(BUSY_RETRIES + 1):
+            async with AsyncSession(self.shard.async_engine, expire_on_commit=False) as session:
+                track_writes(session, INGEST_NAMESPACES)
+                logs = [Log(**values) for values in rows]
+                deltas = {}
+                for log in logs:
+                    session.add(log)
+                    add_log_delta(deltas, log)
+                try:
+                    await session.flush()
+                    await session.run_sync(add_log_tags, logs)
+                    await session.run_sync(apply_deltas, deltas)
+                    await session.commit()
+                    return logs
+                except OperationalError as e:
+                    if attempt == BUSY_RETRIES or not is_busy_error(e):
+                        raise
+            await asyncio.sleep(busy_delay(attempt))
+
+
+# Keyed by shard
+writers: Dict[str, LogWriter] = {}
+
+
+async def submit_log(shard: Shard, log: Log) -> Log:
+    """Write `log` through the shard's group-commit writer; raises QueueFull when it is saturated."""
+    return await writers.setdefault(shard.key, LogWriter()).submit(shard, log)
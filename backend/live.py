@@ -0,0 +1,173 @@
+"""
+Live weekly stats pushed over Server-Sent Events (/stats/stream).
+
+One broadcaster per worker process and shard (see database.py) keeps the
+latest weekly stats payload and fans changes out to every connected client. On connect a client gets a
+`snapshot` event with the full payload; afterwards it only receives
+`delta` events carrying the rituals and quotas whose numbers changed, ids
+that disappeared, the new order when it changed, and `unlock_percent` /
+`week_start` when they moved.
+
+Write routes marked with `cache.invalidates("stats", ...)` wake the
+broadcaster as soon as they return. Writes made by another worker are
+picked up by polling the "stats" data version every
+STATS_STREAM_POLL_SECONDS, so the payload is recomputed once per change,
+not once per client.
+"""
+
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from local_time import local_today
+from versions import data_versions
+
+STREAM_POLL_SECONDS = float(os.getenv("STATS_STREAM_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = 15
+# Events a slow client may fall behind by before it is resynced with a snapshot
+QUEUE_SIZE = 100
+
+ENTITY_KEYS = (("rituals", "ritual_id"), ("quotas", "quota_id"))
+
+
+def diff_weekly(old: dict, new: dict) -> dict:
+    """The parts of `new` that differ from `old`; empty when nothing changed."""
+    delta = {}
+    for key, id_key in ENTITY_KEYS:
+        before = {entry[id_key]: entry for entry in old[key]}
+        after = {entry[id_key]: entry for entry in new[key]}
+        changed = [entry for entry_id, entry in after.items() if before.get(entry_id) != entry]
+        removed = [entry_id for entry_id in before if entry_id not in after]
+        if changed:
+            delta[key] = changed
+        if removed:
+            delta[f"removed_{key}"] = removed
+        if list(before) != list(after):
+            delta[f"{key}_order"] = list(after)
+    for key in ("unlock_percent", "week_start"):
+        if old.get(key) != new.get(key):
+            delta[key] = new[key]
+    return delta
+
+
+class StatsBroadcaster:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.snapshot: Optional[dict] = None
+        self.version = 0
+        self.day = None
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        # State is bound to one event loop; a new loop (e.g. a test client) starts over
+        self.loop = loop
+        self.lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+        self.subscribers = set()
+        self.task = None
+
+    async def _refresh(self, bind, compute: Callable[[AsyncSession], Awaitable[dict]], force: bool = False) -> dict:
+        """Recompute the payload if the data version or the date moved; return the delta."""
+        async with AsyncSession(bind) as session:
+            # Version first: the payload read after it is at least that fresh
+            version = (await data_versions(session, ["stats"]))["stats"]
+            today = local_today()
+            if not force and version == self.version and today == self.day:
+                return {}
+            snapshot = jsonable_encoder(await compute(session))
+        delta = diff_weekly(self.snapshot, snapshot) if self.snapshot else {}
+        self.snapshot, self.version, self.day = snapshot, version, today
+        return delta
+
+    async def subscribe(self, bind, compute: Callable[[AsyncSession], Awaitable[dict]]) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self._reset(loop)
+        async with self.lock:
+            if self.task is None or self.task.done():
+                await self._refresh(bind, compute, force=True)
+                self.task = loop.create_task(self._run(bind, compute))
+            queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+            queue.put_nowait(("snapshot", self.snapshot))
+            self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def notify(self):
+        """Wake the broadcaster after a stats write; safe to call from any thread."""
+        if self.task is None or self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.wake.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+    def _publish(self, event: str, data: dict):
+        for queue in self.subscribers:
+            if queue.full():
+                # The client fell behind; drop its backlog and resync it
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("snapshot", self.snapshot))
+            else:
+                queue.put_nowait((event, data))
+
+    async def _run(self, bind, compute: Callable[[AsyncSession], Awaitable[dict]]):
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self.wake.wait(), STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            delta = await self._refresh(bind, compute)
+            if delta:
+                self._publish("delta", {**delta, "version": self.version})
+
+
+# Keyed by shard; created by the first subscriber, dropped with the last
+broadcasters: Dict[str, StatsBroadcaster] = {}
+
+
+def notify_stats(shard_key: str = ""):
+    """Wake the shard's broadcaster, if it has subscribers; safe to call from any thread."""
+    broadcaster = broadcasters.get(shard_key)
+    if broadcaster is not None:
+        broadcaster.notify()
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_events(request: Request, bind, compute: Callable[[AsyncSession], Awaitable[dict]], shard_key: str = ""):
+    """Yield SSE frames for one client until it disconnects."""
+    broadcaster = broadcasters.setdefault(shard_key, StatsBroadcaster())
+    queue = await broadcaster.subscribe(bind, compute)
+    try:
+        while not await request.is_disconnected():
+            try:
+                event, data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line that keeps proxies from closing an idle stream
+                yield ": ping\n\n"
+                continue
+            yield format_event(event, data)
+    finally:
+        broadcaster.unsubscribe(queue)
+        if not broadcaster.subscribers and broadcasters.get(shard_key) is broadcaster:
+            del broadcasters[shard_key]
@@ -0,0 +1,63 @@
+"""
+Local time, as configured by TZ, and calendar dates.
+
+Log timestamps are local wall-clock times: the frontend stores each log at
+noon of the local day it belongs to, and logs sent without a timestamp get
+`local_now()`. A log's day is therefore the date part of its timestamp, and
+"today", "this week" and "this month" have to be taken in the same local
+time. LOCAL_TIMEZONE comes from TZ, the variable the container is already
+configured with; without TZ the process's local time is used.
+
+`calendar_rows` describes the dates stored in the calendar_day table (see
+calendar_days.py).
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Dates calendar_day is filled with when it is created
+CALENDAR_FIRST = date(2000, 1, 1)
+CALENDAR_LAST = date(2049, 12, 31)
+
+
+def load_timezone(name: Optional[str]) -> Optional[ZoneInfo]:
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name.lstrip(":"))
+    except (ZoneInfoNotFoundError, ValueError):
+        # A POSIX rule such as "AEST-10AEDT"; the C library applies it to datetime.now()
+        return None
+
+
+LOCAL_TIMEZONE = load_timezone(os.getenv("TZ"))
+
+
+def local_now() -> datetime:
+    """The current local wall-clock time, as a naive datetime like the stored timestamps."""
+    if LOCAL_TIMEZONE is None:
+        return datetime.now()
+    return datetime.now(LOCAL_TIMEZONE).replace(tzinfo=None)
+
+
+def local_today() -> date:
+    return local_now().date()
+
+
+def calendar_rows(first: date, last: date):
+    """Yield calendar_day rows for every date from `first` to `last` inclusive."""
+    day = first
+    while day <= last:
+        iso_year, iso_week, _ = day.isocalendar()
+        yield {
+            "day": day,
+            "week_start": day - timedelta(days=day.weekday()),
+            "month_start": day.replace(day=1),
+            "month": day.strftime("%Y-%m"),
+            "year": day.year,
+            "iso_year": iso_year,
+            "iso_week": iso_week,
+        }
+        day += timedelta(days=1)
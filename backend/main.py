@@ -1,5 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from cache import cache
+from database import async_engine, shards
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, registry
 
 app = FastAPI(title="The Game of Life")
 
@@ -16,19 +19,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# Outermost, so the timings include the other middleware
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 def on_startup():
     pass
 
-from routes import config, logs, stats, quotas
+@app.on_event("shutdown")
+async def on_shutdown():
+    await async_engine.dispose()
+    await shards.dispose_all()
+
+from routes import admin, bootstrap, config, logs, stats, quotas
 
 app.include_router(config.router)
 app.include_router(logs.router)
 app.include_router(stats.router)
 app.include_router(quotas.router)
+app.include_router(admin.router)
+app.include_router(bootstrap.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to The Game of Life"}
+
+@app.get("/cache/stats")
+def read_cache_stats():
+    """Hit, miss and eviction counters of the read cache, per namespace."""
+    return cache.stats()
+
+@app.get("/metrics")
+def read_metrics():
+    """Per-route latency, status and SQL query metrics in the Prometheus text format."""
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
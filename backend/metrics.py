@@ -0,0 +1,192 @@
+"""
+Request timing and SQL query instrumentation.
+
+`MetricsMiddleware` times every request, and SQLAlchemy cursor events
+(registered on all engines, sync and async) add each statement's count and
+duration to the request that issued it. Per route template and method the
+app keeps:
+
+- a latency histogram and a request counter per status code,
+- the number of SQL statements and the time spent in them, plus a
+  histogram of statements per request, so an N+1 regression shows up as a
+  shifted distribution rather than only as slower responses.
+
+`/metrics` serves these in the Prometheus text format. Every response also
+carries a `Server-Timing` header (`db;dur=...;desc="N queries", app;dur=...`)
+for the browser's network panel. Work a streaming response does after its
+headers are sent (exports, the SSE stream) counts towards the metrics but
+cannot appear in its header.
+
+Metrics are kept per worker process; with several uvicorn workers each
+scrape sees the worker that answered it.
+"""
+
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestStats:
+    """Statements issued on behalf of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self.lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+            self.responses[(method, route, status)] = self.responses.get((method, route, status), 0) + 1
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines += histogram_lines(
+                "http_request_duration_seconds", "Request latency from receipt to the last body chunk.", self.latency)
+            lines += [
+                "# HELP http_requests_total Requests answered, by status code.",
+                "# TYPE http_requests_total counter",
+            ]
+            lines += [
+                f'http_requests_total{{{labels(method, route)},status="{status}"}} {count}'
+                for (method, route, status), count in sorted(self.responses.items())
+            ]
+            lines += histogram_lines(
+                "db_queries_per_request", "SQL statements executed per request.", self.queries)
+            lines += [
+                "# HELP db_query_duration_seconds_total Time spent executing SQL statements.",
+                "# TYPE db_query_duration_seconds_total counter",
+            ]
+            lines += [
+                f"db_query_duration_seconds_total{{{labels(*key)}}} {seconds:.6f}"
+                for key, seconds in sorted(self.db_seconds.items())
+            ]
+            lines += [
+                "# HELP db_queries_total SQL statements executed.",
+                "# TYPE db_queries_total counter",
+            ]
+            lines += [
+                f"db_queries_total{{{labels(*key)}}} {int(histogram.total)}"
+                for key, histogram in sorted(self.queries.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def labels(method: str, route: str) -> str:
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+def histogram_lines(name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels(*key)},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels(*key)}}} {histogram.total:.6f}")
+        lines.append(f"{name}_count{{{labels(*key)}}} {histogram.count}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(stats: RequestStats, seconds: float) -> str:
+    return f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", app;dur={seconds * 1000:.1f}'
+
+
+class MetricsMiddleware:
+    """ASGI middleware, so streamed responses are timed to their last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                # The route template keeps label values bounded; unmatched paths share one label
+                route = scope.get("route")
+                registry.record(scope["method"], route.path if route else "unmatched", status, time.perf_counter() - start, stats)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Also covers errors and clients that disconnected mid-stream
+            record()
+            current_request.reset(token)
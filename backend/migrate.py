@@ -0,0 +1,35 @@
+"""
+Migration script for Game of Life application.
+Runs `alembic upgrade head` under an exclusive file lock next to the
+database, so when several containers or start scripts share one SQLite
+file the migrations are applied exactly once; later runners wait for the
+lock and then find the schema already at head.
+
+Usage: python migrate.py
+"""
+
+import fcntl
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from database import engine, sqlite_file_name
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+def main():
+    lock_path = f"{sqlite_file_name}.migrate.lock"
+    with open(lock_path, "w") as lock:
+        print("Waiting for migration lock...")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            command.upgrade(Config(ALEMBIC_INI), "head")
+            # WAL is stored in the file, so switch it once before any worker starts
+            with engine.connect() as connection:
+                mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            print(f"✅ Database at head (journal_mode={mode})")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+if __name__ == "__main__":
+    main()
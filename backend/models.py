@@ -1,7 +1,9 @@
 from typing import Optional
 from sqlmodel import Field, SQLModel
-from datetime import datetime
+from sqlalchemy import Index, event
+from datetime import date, datetime
 from enum import Enum
+from local_time import CALENDAR_FIRST, CALENDAR_LAST, calendar_rows, local_now
 
 class MetricType(str, Enum):
     ritual = "ritual"
@@ -32,11 +34,99 @@ class Log(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     ritual_id: Optional[int] = Field(default=None, foreign_key="ritual.id")
     quota_id: Optional[int] = Field(default=None, foreign_key="quota.id")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=local_now)
     value: float
     tag: Optional[str] = None
     metric_type: MetricType
 
+    __table_args__ = (
+        # Covering indexes for the per-entity stats sums and the timeline listing
+        Index("ix_log_ritual_metric_timestamp", "ritual_id", "metric_type", "timestamp", "value"),
+        Index("ix_log_quota_metric_timestamp", "quota_id", "metric_type", "timestamp", "value"),
+        Index("ix_log_timestamp", "timestamp"),
+        # Never reuse the id of a deleted or archived log
+        {"sqlite_autoincrement": True},
+    )
+
+class ArchiveState(SQLModel, table=True):
+    """Single row: logs before `cutoff` live in the archive database (see archive.py)."""
+    __tablename__ = "archive_state"
+
+    id: int = Field(default=1, primary_key=True)
+    cutoff: datetime
+    archived_logs: int = 0
+    updated_at: datetime
+
+class LogDailyRollup(SQLModel, table=True):
+    """Per-day sum and count of logs, maintained by the log write routes."""
+    __tablename__ = "log_daily_rollup"
+
+    metric_type: MetricType = Field(primary_key=True)
+    # 0 stands in for "no ritual/quota" so these can be part of the key
+    ritual_id: int = Field(default=0, primary_key=True)
+    quota_id: int = Field(default=0, primary_key=True)
+    day: date = Field(primary_key=True)
+    total: float = 0
+    entries: int = 0
+
+    __table_args__ = (
+        Index("ix_log_daily_rollup_ritual", "metric_type", "ritual_id", "day", "total", "entries"),
+        Index("ix_log_daily_rollup_quota", "metric_type", "quota_id", "day", "total", "entries"),
+        Index("ix_log_daily_rollup_day", "day", "entries"),
+    )
+
+class CalendarDay(SQLModel, table=True):
+    """One row per date with the week, month and year it belongs to."""
+    __tablename__ = "calendar_day"
+
+    day: date = Field(primary_key=True)
+    week_start: date  # Monday
+    month_start: date
+    month: str  # "YYYY-MM"
+    year: int
+    iso_year: int
+    iso_week: int
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+@event.listens_for(CalendarDay.__table__, "after_create")
+def fill_calendar_day(table, connection, **kw):
+    # For create_all; the migration fills the table itself
+    connection.execute(table.insert(), list(calendar_rows(CALENDAR_FIRST, CALENDAR_LAST)))
+
+class RitualWeek(SQLModel, table=True):
+    """Per-ritual weekly sum of ritual logs, keyed by the week's Monday."""
+    __tablename__ = "ritual_week"
+
+    ritual_id: int = Field(primary_key=True)
+    week_start: date = Field(primary_key=True)
+    total: float = 0
+    entries: int = 0
+
+class RitualStreak(SQLModel, table=True):
+    """Streak summary per ritual, derived from ritual_week and the ritual's weekly target."""
+    __tablename__ = "ritual_streak"
+
+    ritual_id: int = Field(primary_key=True)
+    first_week: Optional[date] = None  # first week with any log
+    weeks_hit: int = 0
+    # The most recent run of consecutive weeks on target
+    latest_run: int = 0
+    latest_run_end: Optional[date] = None
+    longest_run: int = 0
+    longest_run_end: Optional[date] = None
+
+class LogTag(SQLModel, table=True):
+    """One row per word of a log's space-separated tag string."""
+    __tablename__ = "log_tag"
+
+    tag: str = Field(primary_key=True)
+    log_id: int = Field(primary_key=True, foreign_key="log.id")
+
+    __table_args__ = (
+        Index("ix_log_tag_log_id", "log_id"),
+    )
+
 class Reward(SQLModel, table=True):
     roll_number: int = Field(primary_key=True)
     reward_description: str
@@ -45,3 +135,10 @@ class Reward(SQLModel, table=True):
 class Setting(SQLModel, table=True):
     key: str = Field(primary_key=True)
     value: str
+
+class DataVersion(SQLModel, table=True):
+    """Write counter per data namespace; read routes derive their ETags from it."""
+    __tablename__ = "data_version"
+
+    namespace: str = Field(primary_key=True)
+    version: int = 0
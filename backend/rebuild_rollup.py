@@ -0,0 +1,33 @@
+"""
+Rollup rebuild script for Game of Life application.
+Recomputes the tables derived from the raw logs (log_daily_rollup, the
+log_tag index and the ritual streak state). Use it to backfill them on an existing database or to repair
+them if they have drifted.
+"""
+
+from sqlmodel import Session
+from database import engine, create_db_and_tables
+from rollup import rebuild_rollup
+from tags import rebuild_log_tags
+from streaks import rebuild_streaks
+from versions import bump_data_versions
+
+def main():
+    create_db_and_tables()
+
+    with Session(engine) as session:
+        print("Rebuilding daily log rollup...")
+        rows = rebuild_rollup(session)
+        session.commit()
+        print("Rebuilding log tag index...")
+        tag_rows = rebuild_log_tags(session)
+        print("Rebuilding ritual streaks...")
+        week_rows = rebuild_streaks(session)
+        bump_data_versions(session, ["logs", "stats"])
+        session.commit()
+        print(f"✅ Rollup rebuilt: {rows} day rows")
+        print(f"✅ Tag index rebuilt: {tag_rows} tag rows")
+        print(f"✅ Streaks rebuilt: {week_rows} ritual week rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Streak rebuild script for Game of Life application.
+Recomputes ritual_week from the raw logs and every ritual_streak summary
+from it. Use it to repair the streak state, or after changing how weeks are
+counted; rebuild_rollup.py runs it too.
+"""
+
+from sqlmodel import Session
+from database import engine, create_db_and_tables
+from streaks import rebuild_streaks
+from versions import bump_data_versions
+
+def main():
+    create_db_and_tables()
+
+    with Session(engine) as session:
+        print("Rebuilding ritual streaks...")
+        week_rows = rebuild_streaks(session)
+        bump_data_versions(session, ["stats"])
+        session.commit()
+        print(f"✅ Streaks rebuilt: {week_rows} ritual week rows")
+
+if __name__ == "__main__":
+    main()
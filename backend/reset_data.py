@@ -1,15 +1,29 @@
 """
 Data reset script for Game of Life application.
 This script will:
-1. Delete all existing logs, rituals, and quotas
-2. Seed new rituals with specified targets
-3. Seed new quotas
-4. Set the default starting date to January 1, 2026
+1. Snapshot the database into the backup directory (skip with --no-backup)
+2. Delete all existing logs, rituals, and quotas
+3. Seed new rituals with specified targets
+4. Seed new quotas
+5. Set the default starting date to January 1, 2026
+
+Deletes are single set-based statements (SQLite turns an unfiltered DELETE
+into a table truncate), and the wipe and reseed commit as one transaction,
+so an interrupted reset leaves the old data in place.
+
+Usage: python reset_data.py [--yes] [--no-backup]
 """
 
-from sqlmodel import Session, select
+import argparse
+import os
+from sqlmodel import Session, select, delete, func
 from database import engine, create_db_and_tables
-from models import Ritual, Quota, Log, Reward, Setting
+from backup import BACKUP_DIR, create_backup
+from versions import NAMESPACES, bump_data_versions
+from models import ArchiveState, Ritual, Quota, Log, LogDailyRollup, LogTag, RitualStreak, RitualWeek, Reward, Setting
+
+def count_rows(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
 
 def reset_and_seed_data():
     """Reset all data and seed with new configuration"""
@@ -18,24 +32,22 @@ def reset_and_seed_data():
     create_db_and_tables()
     
     with Session(engine) as session:
-        # Delete all existing data
+        # Delete all existing data; derived tables and tags go before the rows they reference
         print("Deleting all existing logs...")
-        logs = session.exec(select(Log)).all()
-        for log in logs:
-            session.delete(log)
+        session.exec(delete(LogTag))
+        session.exec(delete(LogDailyRollup))
+        session.exec(delete(RitualWeek))
+        session.exec(delete(RitualStreak))
+        result = session.exec(delete(Log))
+        print(f"  Deleted {result.rowcount} logs")
+        # Without a cutoff no archived log is visible; the next archive run clears them
+        session.exec(delete(ArchiveState))
         
         print("Deleting all existing rituals...")
-        rituals = session.exec(select(Ritual)).all()
-        for ritual in rituals:
-            session.delete(ritual)
+        session.exec(delete(Ritual))
         
         print("Deleting all existing quotas...")
-        quotas = session.exec(select(Quota)).all()
-        for quota in quotas:
-            session.delete(quota)
-        
-        session.commit()
-        print("All existing data deleted.")
+        session.exec(delete(Quota))
         
         # Seed new rituals (all in minutes per week)
         print("\nSeeding new rituals...")
@@ -99,7 +111,10 @@ def reset_and_seed_data():
             dice_threshold_setting = Setting(key="dice_threshold", value="75")
             session.add(dice_threshold_setting)
         print(f"  Set dice_threshold to: 75%")
-        
+
+        # Invalidate every ETag handed out before the reset
+        bump_data_versions(session, NAMESPACES)
+        # Wipe and reseed become visible together
         session.commit()
         print("\n✅ Data reset and seeding completed successfully!")
         
@@ -107,25 +122,39 @@ def reset_and_seed_data():
         print("\n" + "="*50)
         print("SUMMARY")
         print("="*50)
-        ritual_count = len(session.exec(select(Ritual)).all())
-        quota_count = len(session.exec(select(Quota)).all())
-        log_count = len(session.exec(select(Log)).all())
+        ritual_count = count_rows(session, Ritual)
+        quota_count = count_rows(session, Quota)
+        log_count = count_rows(session, Log)
         
         print(f"Rituals: {ritual_count}")
         print(f"Quotas: {quota_count}")
         print(f"Logs: {log_count}")
         print("="*50)
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Delete all logs, rituals and quotas and seed the defaults.")
+    parser.add_argument("--yes", action="store_true", help="do not ask for confirmation")
+    parser.add_argument("--no-backup", action="store_true", help="skip the snapshot taken before wiping")
+    args = parser.parse_args()
+
     print("="*50)
     print("GAME OF LIFE - DATA RESET")
     print("="*50)
-    print("\n⚠️  WARNING: This will delete ALL existing data!")
-    print("This includes all logs, rituals, and quotas.")
-    print("\nPress Ctrl+C to cancel, or Enter to continue...")
-    
-    try:
-        input()
-        reset_and_seed_data()
-    except KeyboardInterrupt:
-        print("\n\n❌ Reset cancelled by user.")
+
+    if not args.yes:
+        print("\n⚠️  WARNING: This will delete ALL existing data!")
+        print("This includes all logs, rituals, and quotas.")
+        print("\nPress Ctrl+C to cancel, or Enter to continue...")
+        try:
+            input()
+        except KeyboardInterrupt:
+            print("\n\n❌ Reset cancelled by user.")
+            return
+
+    if not args.no_backup:
+        print("Backing up the database...")
+        print(f"  Snapshot saved to: {os.path.join(BACKUP_DIR, create_backup('pre-reset')['name'])}")
+    reset_and_seed_data()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Daily rollup of log values.
+
+`log_daily_rollup` holds one row per (metric_type, ritual, quota, day) with
+the sum and count of the matching logs. The log write routes keep it current
+in the same transaction as the log change, and `rebuild_rollup` recomputes it
+from the raw log table.
+"""
+
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from archive import all_logs
+from calendar_days import cover_days, cover_logs
+from models import Log, LogDailyRollup, MetricType
+from streaks import apply_week_deltas
+
+KEY_COLUMNS = ("metric_type", "ritual_id", "quota_id", "day")
+
+
+def add_delta(deltas: Dict[tuple, List[float]], metric_type, ritual_id, quota_id, day: date, total: float, entries: int):
+    """Accumulate a change of `total`/`entries` for one rollup key into `deltas`."""
+    key = (MetricType(metric_type), ritual_id or 0, quota_id or 0, day)
+    delta = deltas.setdefault(key, [0.0, 0])
+    delta[0] += total
+    delta[1] += entries
+
+
+def add_log_delta(deltas: Dict[tuple, List[float]], log: Log, sign: int = 1):
+    """Accumulate a log's contribution (sign=1) or removal (sign=-1) into `deltas`."""
+    add_delta(deltas, log.metric_type, log.ritual_id, log.quota_id, log.timestamp.date(), sign * log.value, sign)
+
+
+def apply_deltas(session: Session, deltas: Dict[tuple, List[float]]):
+    """
+    Upsert accumulated deltas into the rollup in one executemany statement.
+    Ritual deltas are also folded into the weekly streak state.
+    """
+    rows = [
+        dict(zip(KEY_COLUMNS, key), total=total, entries=entries)
+        for key, (total, entries) in deltas.items()
+        if total or entries
+    ]
+    if not rows:
+        return
+    # Stats join rollup days to the calendar, so every day needs a calendar row
+    cover_days(session, {row["day"] for row in rows})
+
+    stmt = insert(LogDailyRollup.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            "total": LogDailyRollup.total + stmt.excluded.total,
+            "entries": LogDailyRollup.entries + stmt.excluded.entries,
+        },
+    )
+    session.exec(stmt, params=rows)
+
+    # Drop rows whose last log went away so the table only holds active days
+    emptied_days = {row["day"] for row in rows if row["entries"] < 0}
+    if emptied_days:
+        session.exec(
+            delete(LogDailyRollup)
+            .where(LogDailyRollup.day.in_(emptied_days))
+            .where(LogDailyRollup.entries <= 0)
+        )
+
+    apply_week_deltas(session, deltas)
+
+
+def apply_log(session: Session, log: Log, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a log's contribution to its rollup row."""
+    deltas = {}
+    add_log_delta(deltas, log, sign)
+    apply_deltas(session, deltas)
+
+
+def rebuild_rollup(session: Session) -> int:
+    """
+    Recompute the whole rollup table from the log table and the archive.
+    Returns the number of rollup rows.
+    """
+    logs = all_logs(session)
+    day = func.date(logs.c.timestamp)
+    ritual_id = func.coalesce(logs.c.ritual_id, 0)
+    quota_id = func.coalesce(logs.c.quota_id, 0)
+    grouped = select(
+        logs.c.metric_type, ritual_id, quota_id, day, func.sum(logs.c.value), func.count()
+    ).group_by(logs.c.metric_type, ritual_id, quota_id, day)
+
+    cover_logs(session)
+    session.exec(delete(LogDailyRollup))
+    session.exec(
+        insert(LogDailyRollup).from_select(list(KEY_COLUMNS) + ["total", "entries"], grouped)
+    )
+    return session.exec(select(func.count()).select_from(LogDailyRollup)).one()
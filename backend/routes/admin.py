@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from cache import evict, invalidates
+from database import SHARD_DIR, USER_ID
+from versions import NAMESPACES
+import backup
+from typing import List, Optional
+import os
+import secrets
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin routes are off unless ADMIN_TOKEN is set, and then need it in X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def backup_user(user: Optional[str] = None) -> Optional[str]:
+    """
+    The `user` query parameter: whose shard a backup route works on. Only
+    valid with SHARD_DIR, where the main database holds no user data.
+    """
+    if user is None:
+        return None
+    if not SHARD_DIR:
+        raise HTTPException(status_code=400, detail="user only applies with SHARD_DIR set")
+    if not USER_ID.match(user):
+        raise HTTPException(status_code=400, detail="Invalid user")
+    return user
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/backups", response_model=List[dict])
+def read_backups(user: Optional[str] = Depends(backup_user)):
+    """Snapshots, newest first; with SHARD_DIR, every user's unless `user` is given."""
+    if SHARD_DIR and user is None:
+        return backup.list_shard_backups()
+    return backup.list_backups(user)
+
+@router.post("/backups")
+def create_backup(compress: bool = True, user: Optional[str] = Depends(backup_user)):
+    """
+    Take an online snapshot of the live database, then rotate old snapshots.
+    With SHARD_DIR, snapshot `user`'s shard, or every shard (returned as a list).
+    """
+    try:
+        if SHARD_DIR and user is None:
+            return backup.create_shard_backups(compress=compress)
+        return backup.create_backup(compress=compress, user=user)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/backups/{name}/restore")
+@invalidates(*NAMESPACES)
+def restore_backup(name: str, user: Optional[str] = Depends(backup_user)):
+    """
+    Replace all data with snapshot `name` while the server keeps running.
+    The data being replaced is saved first as a `pre-restore` snapshot.
+    With SHARD_DIR, `user` names the shard to restore.
+    """
+    if SHARD_DIR and user is None:
+        raise HTTPException(status_code=400, detail="Name the user whose shard to restore")
+    try:
+        result = backup.restore_backup(name, user)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if user:
+        # invalidates() evicts the request's scope, which for admin routes is the main database
+        evict(NAMESPACES, user)
+    return result
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from versions import conditional
+from database import begin_read, get_async_session
+from models import Ritual, Quota, Reward, Setting
+from routes.stats import weekly_progress
+
+router = APIRouter(tags=["bootstrap"])
+
+@router.get("/bootstrap", dependencies=[conditional("rituals", "quotas", "rewards", "settings", "stats")])
+async def get_bootstrap(session: AsyncSession = Depends(get_async_session)):
+    """
+    Everything the app needs on load in one response: rituals, quotas,
+    rewards, all settings and the /stats/weekly payload. Every part is read
+    from the same snapshot, in one query per table plus one for the week's
+    totals, so the weekly stats always match the rituals and quotas beside them.
+    """
+    await begin_read(session)
+    rituals = (await session.exec(select(Ritual).order_by(Ritual.sort_order))).all()
+    quotas = (await session.exec(select(Quota))).all()
+    rewards = (await session.exec(select(Reward).order_by(Reward.roll_number))).all()
+    settings = (await session.exec(select(Setting))).all()
+    return {
+        "rituals": rituals,
+        "quotas": quotas,
+        "rewards": rewards,
+        "settings": settings,
+        "weekly": await weekly_progress(session, rituals, quotas),
+    }
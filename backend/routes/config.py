@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from database import get_session
+from cache import cached, invalidates
+from versions import conditional
+from database import get_session, retry_on_busy
 from models import Ritual, Reward, Setting
+from streaks import refresh_streaks
 from typing import List
 from pydantic import BaseModel
 
@@ -9,18 +12,23 @@ router = APIRouter(prefix="/config", tags=["config"])
 
 # --- Rituals ---
 @router.post("/rituals", response_model=Ritual)
+@invalidates("rituals", "stats")
+@retry_on_busy
 def create_ritual(ritual: Ritual, session: Session = Depends(get_session)):
     session.add(ritual)
     session.commit()
     session.refresh(ritual)
     return ritual
 
-@router.get("/rituals", response_model=List[Ritual])
+@router.get("/rituals", response_model=List[Ritual], dependencies=[conditional("rituals")])
+@cached("rituals")
 def read_rituals(session: Session = Depends(get_session)):
     rituals = session.exec(select(Ritual)).all()
     return rituals
 
 @router.delete("/rituals/{ritual_id}")
+@invalidates("rituals", "stats")
+@retry_on_busy
 def delete_ritual(ritual_id: int, session: Session = Depends(get_session)):
     ritual = session.get(Ritual, ritual_id)
     if not ritual:
@@ -30,6 +38,8 @@ def delete_ritual(ritual_id: int, session: Session = Depends(get_session)):
     return {"ok": True}
 
 @router.put("/rituals/{ritual_id}", response_model=Ritual)
+@invalidates("rituals", "stats")
+@retry_on_busy
 def update_ritual(ritual_id: int, ritual: Ritual, session: Session = Depends(get_session)):
     db_ritual = session.get(Ritual, ritual_id)
     if not db_ritual:
@@ -42,6 +52,9 @@ def update_ritual(ritual_id: int, ritual: Ritual, session: Session = Depends(get
     db_ritual.icon = ritual.icon
     db_ritual.default_tag = ritual.default_tag
     session.add(db_ritual)
+    session.flush()
+    # Weeks on target depend on the target and period
+    refresh_streaks(session, [ritual_id])
     session.commit()
     session.refresh(db_ritual)
     return db_ritual
@@ -50,6 +63,8 @@ class ReorderRequest(BaseModel):
     ritual_ids: List[int]
 
 @router.post("/rituals/reorder")
+@invalidates("rituals", "stats")
+@retry_on_busy
 def reorder_rituals(request: ReorderRequest, session: Session = Depends(get_session)):
     for index, ritual_id in enumerate(request.ritual_ids):
         ritual = session.get(Ritual, ritual_id)
@@ -61,6 +76,8 @@ def reorder_rituals(request: ReorderRequest, session: Session = Depends(get_sess
 
 # --- Rewards ---
 @router.post("/rewards", response_model=Reward)
+@invalidates("rewards")
+@retry_on_busy
 def create_reward(reward: Reward, session: Session = Depends(get_session)):
     existing = session.get(Reward, reward.roll_number)
     if existing:
@@ -73,12 +90,15 @@ def create_reward(reward: Reward, session: Session = Depends(get_session)):
     session.refresh(reward if not existing else existing)
     return reward if not existing else existing
 
-@router.get("/rewards", response_model=List[Reward])
+@router.get("/rewards", response_model=List[Reward], dependencies=[conditional("rewards")])
+@cached("rewards")
 def read_rewards(session: Session = Depends(get_session)):
     return session.exec(select(Reward).order_by(Reward.roll_number)).all()
 
 # --- Settings ---
 @router.post("/settings", response_model=Setting)
+@invalidates("settings")
+@retry_on_busy
 def update_setting(setting: Setting, session: Session = Depends(get_session)):
     existing = session.get(Setting, setting.key)
     if existing:
@@ -90,11 +110,13 @@ def update_setting(setting: Setting, session: Session = Depends(get_session)):
     session.refresh(setting if not existing else existing)
     return setting if not existing else existing
 
-@router.get("/settings", response_model=List[Setting])
+@router.get("/settings", response_model=List[Setting], dependencies=[conditional("settings")])
+@cached("settings")
 def read_settings(session: Session = Depends(get_session)):
     return session.exec(select(Setting)).all()
 
-@router.get("/settings/{key}", response_model=Setting)
+@router.get("/settings/{key}", response_model=Setting, dependencies=[conditional("settings")])
+@cached("settings")
 def get_setting(key: str, session: Session = Depends(get_session)):
     setting = session.get(Setting, key)
     if not setting:
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlmodel import Session, select
-from database import get_session
-from models import Log, MetricType, Ritual, Quota
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlmodel import Session, select, delete, func, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from cache import invalidates
+from versions import conditional
+from database import Shard, current_shard, get_session, get_async_session, retry_on_busy
+from models import Log, LogTag, MetricType, Ritual, Quota
+from rollup import apply_log, add_log_delta, apply_deltas
+from tags import add_log_tags, clear_log_tags, replace_log_tags
+from archive import ARCHIVE_LOG, archived_ids, archived_logs, load_archive, open_archive, visible_archived_tags, with_archive
+from local_time import local_now
+import columnar
+import ingest
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+import base64
 import csv
 import io
 from datetime import datetime
@@ -18,103 +31,341 @@ class LogCreate(BaseModel):
     tag: Optional[str] = None
     metric_type: str
 
-@router.post("/", response_model=Log)
-def create_log(log_data: LogCreate, session: Session = Depends(get_session)):
-    # Parse timestamp if provided, otherwise use current time
-    if log_data.timestamp:
-        # Remove spaces and replace Z with timezone
-        cleaned_timestamp = log_data.timestamp.replace(' ', '').replace('Z', '+00:00')
-        timestamp = datetime.fromisoformat(cleaned_timestamp)
-    else:
-        timestamp = datetime.utcnow()
-    
-    log = Log(
+class LogBatchOperation(BaseModel):
+    action: Literal["create", "update", "delete"]
+    log_id: Optional[int] = None  # required for update and delete
+    log: Optional[LogCreate] = None  # required for create and update
+
+class LogBatch(BaseModel):
+    operations: List[LogBatchOperation] = Field(min_length=1)
+
+class LogBatchResult(BaseModel):
+    logs: List[Log]
+    deleted: List[int]
+
+def parse_timestamp(value: str) -> datetime:
+    # Remove spaces and replace Z with timezone
+    cleaned_timestamp = value.replace(' ', '').replace('Z', '+00:00')
+    return datetime.fromisoformat(cleaned_timestamp)
+
+def new_log(log_data: LogCreate) -> Log:
+    return Log(
         ritual_id=log_data.ritual_id,
         quota_id=log_data.quota_id,
-        timestamp=timestamp,
+        timestamp=parse_timestamp(log_data.timestamp) if log_data.timestamp else local_now(),
         value=log_data.value,
         tag=log_data.tag,
-        metric_type=log_data.metric_type
+        metric_type=MetricType(log_data.metric_type)
     )
-    session.add(log)
-    session.commit()
-    session.refresh(log)
-    return log
-
-@router.get("/", response_model=List[Log])
-def read_logs(session: Session = Depends(get_session)):
-    return session.exec(select(Log).order_by(Log.timestamp.desc()).limit(100)).all()
 
-@router.put("/{log_id}", response_model=Log)
-def update_log(log_id: int, log_update: LogCreate, session: Session = Depends(get_session)):
-    db_log = session.get(Log, log_id)
-    if not db_log:
-        raise HTTPException(status_code=404, detail="Log not found")
-    
+def update_fields(db_log: Log, log_update: LogCreate):
     db_log.ritual_id = log_update.ritual_id
     db_log.quota_id = log_update.quota_id
     db_log.value = log_update.value
     db_log.tag = log_update.tag
-    db_log.metric_type = log_update.metric_type
+    db_log.metric_type = MetricType(log_update.metric_type)
     
     # Update timestamp if provided
     if log_update.timestamp:
-        # Remove spaces and replace Z with timezone
-        cleaned_timestamp = log_update.timestamp.replace(' ', '').replace('Z', '+00:00')
-        db_log.timestamp = datetime.fromisoformat(cleaned_timestamp)
+        db_log.timestamp = parse_timestamp(log_update.timestamp)
+
+def log_filters(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    ritual_id: Optional[int] = None,
+    quota_id: Optional[int] = None,
+    metric_type: Optional[MetricType] = None,
+    tag: Optional[str] = None,
+):
+    """
+    Shared query-string filters for log listings.
+    `start` is inclusive and `end` exclusive; `tag` matches one word of the
+    space-separated tag string.
+    """
+    filters = []
+    if start:
+        filters.append(Log.timestamp >= start)
+    if end:
+        filters.append(Log.timestamp < end)
+    if ritual_id is not None:
+        filters.append(Log.ritual_id == ritual_id)
+    if quota_id is not None:
+        filters.append(Log.quota_id == quota_id)
+    if metric_type:
+        filters.append(Log.metric_type == metric_type)
+    if tag:
+        filters.append(Log.id.in_(select(LogTag.log_id).where(LogTag.tag == tag)))
+    return filters
+
+def encode_cursor(log: Log) -> str:
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.post("/", response_model=Log)
+@invalidates("stats", "logs")
+@retry_on_busy
+async def create_log(
+    log_data: LogCreate,
+    session: AsyncSession = Depends(get_async_session),
+    shard: Shard = Depends(current_shard),
+):
+    # Timestamp defaults to the current time when not provided
+    log = new_log(log_data)
+    if ingest.INGEST_QUEUE:
+        # Committed by the shard's group-commit writer instead of this session
+        try:
+            return await ingest.submit_log(shard, log)
+        except ingest.QueueFull:
+            raise HTTPException(status_code=503, detail="Too many log writes queued", headers={"Retry-After": "1"})
+    session.add(log)
+    await session.run_sync(apply_log, log)
+    await session.flush()
+    await session.run_sync(add_log_tags, [log])
+    await session.commit()
+    await session.refresh(log)
+    return log
+
+@router.get("/", response_model=List[Log], dependencies=[conditional("logs")])
+async def read_logs(
+    response: Response,
+    filters: list = Depends(log_filters),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    List logs newest first, one page at a time.
+    When more rows match, the X-Next-Cursor header carries the cursor for the
+    next page; pass it back as `cursor` with the same filters.
+    """
+    if cursor:
+        # Keyset pagination: continue strictly after the last (timestamp, id) seen
+        filters = [*filters, tuple_(Log.timestamp, Log.id) < decode_cursor(cursor)]
+    query = select(Log).where(*filters)
+    query = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit + 1)
+
+    logs = (await session.exec(query)).all()
+    cutoff = await load_archive(session)
+    # Archived logs are all older than the cutoff, so they can only belong on
+    # this page when it runs out of hot logs or reaches past the cutoff
+    if cutoff and (len(logs) <= limit or logs[-1].timestamp < cutoff):
+        archived = archived_logs(cutoff, filters)
+        archived = archived.order_by(ARCHIVE_LOG.c.timestamp.desc(), ARCHIVE_LOG.c.id.desc()).limit(limit + 1)
+        # Rows have the log attributes the response and the cursor need
+        logs = [*logs, *(await session.exec(archived)).all()]
+        logs = sorted(logs, key=lambda log: (log.timestamp, log.id), reverse=True)[:limit + 1]
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(logs[-1])
+    return logs
+
+@router.post("/batch", response_model=LogBatchResult)
+@invalidates("stats", "logs")
+@retry_on_busy
+async def batch_logs(batch: LogBatch, session: AsyncSession = Depends(get_async_session)):
+    """
+    Apply a list of create/update/delete operations in one transaction.
+    Returns the created and updated rows (in operation order) and the deleted
+    ids; a row updated and then deleted in the batch is only listed as deleted.
+    """
+    for op in batch.operations:
+        if op.action != "create" and op.log_id is None:
+            raise HTTPException(status_code=422, detail=f"log_id is required for {op.action}")
+        if op.action != "delete" and op.log is None:
+            raise HTTPException(status_code=422, detail=f"log is required for {op.action}")
+
+    # Load every referenced log up front in one query
+    ids = {op.log_id for op in batch.operations if op.action != "create"}
+    existing = {log.id: log for log in (await session.exec(select(Log).where(Log.id.in_(ids)))).all()} if ids else {}
+    missing = ids - existing.keys()
+    if missing:
+        archived = await archived_ids(session, missing)
+        if archived:
+            raise HTTPException(status_code=409, detail=f"Archived logs are read-only: {sorted(archived)}")
+        raise HTTPException(status_code=404, detail=f"Logs not found: {sorted(missing)}")
+
+    results = []
+    created = []
+    updated = []
+    deleted = []
+    deltas = {}
+    for op in batch.operations:
+        if op.action == "create":
+            log = new_log(op.log)
+            session.add(log)
+            add_log_delta(deltas, log)
+            results.append(log)
+            created.append(log)
+            continue
+
+        db_log = existing.get(op.log_id)
+        if db_log is None:
+            raise HTTPException(status_code=409, detail=f"Log {op.log_id} was deleted earlier in the batch")
+        add_log_delta(deltas, db_log, -1)
+        if op.action == "update":
+            update_fields(db_log, op.log)
+            add_log_delta(deltas, db_log)
+            results.append(db_log)
+            updated.append(db_log)
+        else:
+            del existing[op.log_id]
+            deleted.append(op.log_id)
+
+    # Inserts and updates go out as batched statements on flush
+    await session.flush()
+    await session.run_sync(clear_log_tags, deleted)
+    if deleted:
+        await session.exec(delete(Log).where(Log.id.in_(deleted)))
+    # Skip logs that were updated and then deleted in the same batch
+    await session.run_sync(replace_log_tags, {log.id: log for log in updated if log.id in existing}.values())
+    await session.run_sync(add_log_tags, created)
+    await session.run_sync(apply_deltas, deltas)
+    logs = [log.model_dump() for log in results if log.id not in deleted]
+    await session.commit()
+    return {"logs": logs, "deleted": deleted}
+
+@router.put("/{log_id}", response_model=Log)
+@invalidates("stats", "logs")
+@retry_on_busy
+async def update_log(log_id: int, log_update: LogCreate, session: AsyncSession = Depends(get_async_session)):
+    db_log = await session.get(Log, log_id)
+    if not db_log:
+        if await archived_ids(session, [log_id]):
+            raise HTTPException(status_code=409, detail="Archived logs are read-only")
+        raise HTTPException(status_code=404, detail="Log not found")
     
+    # Move the log's contribution out of its old rollup day
+    await session.run_sync(apply_log, db_log, -1)
+    update_fields(db_log, log_update)
     session.add(db_log)
-    session.commit()
-    session.refresh(db_log)
+    await session.run_sync(apply_log, db_log)
+    await session.run_sync(replace_log_tags, [db_log])
+    await session.commit()
+    await session.refresh(db_log)
     return db_log
 
 @router.delete("/{log_id}")
-def delete_log(log_id: int, session: Session = Depends(get_session)):
-    log = session.get(Log, log_id)
+@invalidates("stats", "logs")
+@retry_on_busy
+async def delete_log(log_id: int, session: AsyncSession = Depends(get_async_session)):
+    log = await session.get(Log, log_id)
     if not log:
+        if await archived_ids(session, [log_id]):
+            raise HTTPException(status_code=409, detail="Archived logs are read-only")
         raise HTTPException(status_code=404, detail="Log not found")
-    session.delete(log)
-    session.commit()
+    await session.run_sync(apply_log, log, -1)
+    await session.run_sync(clear_log_tags, [log_id])
+    await session.delete(log)
+    await session.commit()
     return {"ok": True}
 
-@router.get("/export")
-def export_logs(session: Session = Depends(get_session)):
-    logs = session.exec(select(Log)).all()
-    rituals = session.exec(select(Ritual)).all()
-    quotas = session.exec(select(Quota)).all()
-    
-    # Create lookup maps
-    ritual_map = {r.id: r.name for r in rituals}
-    quota_map = {q.id: q.name for q in quotas}
-    
+EXPORT_CHUNK_SIZE = 1000
+
+def export_rows(bind, filters: list):
+    """Yield CSV text one chunk of logs at a time from a server-side cursor."""
+    # `id` is labelled so the ORDER BY after the archive's UNION ALL can name it
+    query = (
+        select(
+            Log.id.label("id"), Log.ritual_id, Log.quota_id,
+            func.coalesce(Ritual.name, Quota.name, ""),
+            Log.timestamp, Log.value, Log.tag, Log.metric_type,
+        )
+        .outerjoin(Ritual, Ritual.id == Log.ritual_id)
+        .outerjoin(Quota, Quota.id == Log.quota_id)
+        .where(*filters)
+    )
+
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(["id", "ritual_id", "quota_id", "name", "timestamp", "value", "tag", "metric_type"])
-    
-    for log in logs:
-        name = ""
-        if log.ritual_id and log.ritual_id in ritual_map:
-            name = ritual_map[log.ritual_id]
-        elif log.quota_id and log.quota_id in quota_map:
-            name = quota_map[log.quota_id]
-            
-        writer.writerow([log.id, log.ritual_id, log.quota_id, name, log.timestamp, log.value, log.tag, log.metric_type])
-    
-    return Response(content=output.getvalue(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=logs.csv"})
 
-@router.get("/tags", response_model=List[str])
-def get_tags(session: Session = Depends(get_session)):
+    # The response outlives the request's session, so the stream opens its own
+    with Session(bind) as session:
+        query = with_archive(query, open_archive(session))
+        query = query.order_by(query.selected_columns.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        for chunk in session.exec(query).partitions():
+            writer.writerows(chunk)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+@router.get("/export")
+def export_logs(
+    format: Literal["csv", "parquet", "arrow"] = "csv",
+    filters: list = Depends(log_filters),
+    shard: Shard = Depends(current_shard),
+):
+    """
+    Stream logs as CSV, Parquet or an Arrow IPC stream.
+    Accepts the same filters as the log listing. Like the import, this stays
+    a sync route: the stream is produced in the threadpool.
+    """
+    # The stream outlives the request's dependencies; keep the shard open until it ends
+    shard.acquire()
+    try:
+        if format == "csv":
+            media_type, filename = "text/csv", "logs.csv"
+            body = export_rows(shard.engine, filters)
+        else:
+            media_type, filename = columnar.FORMATS[format]
+            body = columnar.stream_logs(shard.engine, filters, format)
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            background=BackgroundTask(shard.release),
+        )
+    except BaseException:
+        shard.release()
+        raise
+
+@router.post("/import")
+@invalidates("stats", "logs")
+@retry_on_busy
+def import_logs(file: UploadFile, keep_ids: bool = False, session: Session = Depends(get_session)):
+    """Bulk load a Parquet or Arrow file produced by the columnar export."""
+    # Rewind in case a busy retry is re-reading the upload
+    file.file.seek(0)
+    try:
+        imported = columnar.import_logs(session, file.file, keep_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Imported ids clash with existing logs")
+    session.commit()
+    return {"imported": imported}
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+@router.get("/tags", response_model=List[str], dependencies=[conditional("logs")])
+async def get_tags(session: AsyncSession = Depends(get_async_session)):
     """
     Fetch all unique tags used in logs.
-    Splits tag strings by space to handle multiple tags per entry.
+    Read from the log_tag index, which already splits multi-tag entries.
     """
-    logs = session.exec(select(Log.tag).where(Log.tag != None)).all()
-    unique_tags = set()
-    for tag_str in logs:
-        if tag_str:
-            # Split by space to handle multiple tags
-            parts = tag_str.split()
-            for part in parts:
-                unique_tags.add(part)
-    
-    return sorted(list(unique_tags))
+    query = select(LogTag.tag)
+    cutoff = await load_archive(session)
+    if cutoff:
+        query = query.union(select(visible_archived_tags(cutoff).subquery().c.tag))
+        return (await session.exec(query.order_by(query.selected_columns[0]))).scalars().all()
+    return (await session.exec(query.distinct().order_by(LogTag.tag))).all()
+
+@router.get("/tags/counts", response_model=List[TagCount], dependencies=[conditional("logs")])
+async def get_tag_counts(session: AsyncSession = Depends(get_async_session)):
+    """Number of logs using each tag, most used first."""
+    cutoff = await load_archive(session)
+    tags = select(LogTag.tag, LogTag.log_id)
+    tags = tags.union_all(visible_archived_tags(cutoff)).subquery() if cutoff else LogTag.__table__
+    count = func.count().label("count")
+    rows = (await session.exec(select(tags.c.tag, count).group_by(tags.c.tag).order_by(count.desc(), tags.c.tag))).all()
+    return [{"tag": tag, "count": n} for tag, n in rows]
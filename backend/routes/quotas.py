@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from database import get_session
+from cache import cached, invalidates
+from versions import conditional
+from database import get_session, retry_on_busy
 from models import Quota
 from typing import List
 from pydantic import BaseModel
@@ -8,18 +10,23 @@ from pydantic import BaseModel
 router = APIRouter(prefix="/quotas", tags=["quotas"])
 
 @router.post("/", response_model=Quota)
+@invalidates("quotas", "stats")
+@retry_on_busy
 def create_quota(quota: Quota, session: Session = Depends(get_session)):
     session.add(quota)
     session.commit()
     session.refresh(quota)
     return quota
 
-@router.get("/", response_model=List[Quota])
+@router.get("/", response_model=List[Quota], dependencies=[conditional("quotas")])
+@cached("quotas")
 def read_quotas(session: Session = Depends(get_session)):
     quotas = session.exec(select(Quota)).all()
     return quotas
 
 @router.put("/{quota_id}", response_model=Quota)
+@invalidates("quotas", "stats")
+@retry_on_busy
 def update_quota(quota_id: int, quota: Quota, session: Session = Depends(get_session)):
     db_quota = session.get(Quota, quota_id)
     if not db_quota:
@@ -36,6 +43,8 @@ def update_quota(quota_id: int, quota: Quota, session: Session = Depends(get_ses
     return db_quota
 
 @router.delete("/{quota_id}")
+@invalidates("quotas", "stats")
+@retry_on_busy
 def delete_quota(quota_id: int, session: Session = Depends(get_session)):
     quota = session.get(Quota, quota_id)
     if not quota:
@@ -48,6 +57,8 @@ class ReorderRequest(BaseModel):
     quota_ids: List[int]
 
 @router.post("/reorder")
+@invalidates("quotas", "stats")
+@retry_on_busy
 def reorder_quotas(request: ReorderRequest, session: Session = Depends(get_session)):
     for index, quota_id in enumerate(request.quota_ids):
         quota = session.get(Quota, quota_id)
@@ -1,36 +1,77 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select, func
-from database import get_session
-from models import Log, Ritual, Quota, MetricType
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from cache import cached
+from versions import conditional
+from database import Shard, current_shard, get_async_session
+from models import Ritual, Quota, RitualStreak, RitualWeek
+from aggregation import bucket_count, bucket_starts, load_period_totals, load_range_series
+from live import stream_events
+from local_time import local_today
+from streaks import current_streak, week_start, weekly_target
+from datetime import date, datetime, timedelta
+from typing import List, Literal
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
-@router.get("/weekly")
-def get_weekly_stats(session: Session = Depends(get_session)):
+# Upper bound on points per series, e.g. about 13 years of daily buckets
+MAX_RANGE_BUCKETS = 5000
+
+@router.get("/weekly", dependencies=[conditional("stats")])
+@cached("stats")
+async def get_weekly_stats(session: AsyncSession = Depends(get_async_session)):
+    return await weekly_stats(session)
+
+@router.get("/stream")
+async def stream_stats(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    shard: Shard = Depends(current_shard),
+):
+    """
+    Server-Sent Events feed of the weekly stats: a `snapshot` event with the
+    /stats/weekly payload, then a `delta` event whenever a write changes it.
+    """
+    # The stream outlives the request's dependencies; keep the shard open until it ends
+    shard.acquire()
+    return StreamingResponse(
+        stream_events(request, session.bind, weekly_stats, shard.key),
+        media_type="text/event-stream",
+        # Stop nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(shard.release),
+    )
+
+async def weekly_stats(session: AsyncSession) -> dict:
+    """Progress of every ritual and quota for the current week, as served by /stats/weekly."""
+    # Get all rituals ordered by sort_order
+    rituals = (await session.exec(select(Ritual).order_by(Ritual.sort_order))).all()
+    quotas = (await session.exec(select(Quota))).all()
+    return await weekly_progress(session, rituals, quotas)
+
+async def weekly_progress(session: AsyncSession, rituals: List[Ritual], quotas: List[Quota]) -> dict:
+    """`weekly_stats` for rituals and quotas the caller already loaded."""
     # Calculate start of week (Monday)
-    today = datetime.utcnow().date()
+    today = local_today()
     start_of_week = today - timedelta(days=today.weekday())
     start_datetime = datetime.combine(start_of_week, datetime.min.time())
-    
-    # Get all rituals ordered by sort_order
-    rituals = session.exec(select(Ritual).order_by(Ritual.sort_order)).all()
+
+    # Sum every ritual and quota for this week in one grouped query
+    totals = await load_period_totals(
+        session,
+        start_datetime,
+        ritual_ids=[r.id for r in rituals],
+        quota_ids=[q.id for q in quotas],
+    )
     
     stats = []
     total_completed = 0
     total_targets = 0
     
     for ritual in rituals:
-        # Sum logs for this ritual this week
-        logs = session.exec(
-            select(Log)
-            .where(Log.ritual_id == ritual.id)
-            .where(Log.timestamp >= start_datetime)
-            .where(Log.metric_type == MetricType.ritual)
-        ).all()
-        
-        current_value = sum(log.value for log in logs)
+        current_value = totals.rituals.get(ritual.id, 0)
         percent = min(100, (current_value / ritual.target_value) * 100) if ritual.target_value > 0 else 0
         
         stats.append({
@@ -50,22 +91,13 @@ def get_weekly_stats(session: Session = Depends(get_session)):
     unlock_percent = (total_completed / total_targets * 100) if total_targets > 0 else 0
     
     # Get quota stats for the week
-    quotas = session.exec(select(Quota)).all()
     quota_stats = []
     
     for quota in quotas:
-        logs = session.exec(
-            select(Log)
-            .where(Log.quota_id == quota.id)
-            .where(Log.timestamp >= start_datetime)
-            .where(Log.metric_type == MetricType.quota)
-        ).all()
-        
-        total_value = sum(log.value for log in logs)
         quota_stats.append({
             "quota_id": quota.id,
             "name": quota.name,
-            "total": total_value,
+            "total": totals.quotas.get(quota.id, 0),
             "unit": quota.unit,
             "category": quota.category,
             "icon": quota.icon,
@@ -79,9 +111,10 @@ def get_weekly_stats(session: Session = Depends(get_session)):
         "week_start": start_of_week
     }
 
-@router.get("/yearly")
-def get_yearly_stats(session: Session = Depends(get_session)):
-    today = datetime.utcnow().date()
+@router.get("/yearly", dependencies=[conditional("stats")])
+@cached("stats")
+async def get_yearly_stats(session: AsyncSession = Depends(get_async_session)):
+    today = local_today()
     start_of_year = datetime(today.year, 1, 1)
     
     # Year progress
@@ -89,39 +122,30 @@ def get_yearly_stats(session: Session = Depends(get_session)):
     day_of_year = today.timetuple().tm_yday
     year_progress = (day_of_year / days_in_year) * 100
     
-    # Monthly breakdown (simplified)
-    # Group logs by month
-    logs = session.exec(select(Log).where(Log.timestamp >= start_of_year)).all()
-    monthly_counts = {}
-    
-    for log in logs:
-        month = log.timestamp.strftime("%Y-%m")
-        monthly_counts[month] = monthly_counts.get(month, 0) + 1
-    
+    rituals = (await session.exec(select(Ritual).order_by(Ritual.sort_order))).all()
+    quotas = (await session.exec(select(Quota).order_by(Quota.sort_order))).all()
+
+    # Totals, monthly breakdowns and overall monthly activity are all
+    # grouped by month in the database in a single query
+    totals = await load_period_totals(
+        session,
+        start_of_year,
+        ritual_ids=[r.id for r in rituals],
+        quota_ids=[q.id for q in quotas],
+        by_month=True,
+        activity=True,
+    )
+
     # Ritual statistics
-    rituals = session.exec(select(Ritual).order_by(Ritual.sort_order)).all()
     ritual_stats = []
 
     for ritual in rituals:
-        logs = session.exec(
-            select(Log)
-            .where(Log.ritual_id == ritual.id)
-            .where(Log.timestamp >= start_of_year)
-            .where(Log.metric_type == MetricType.ritual)
-        ).all()
-
-        total_value = sum(log.value for log in logs)
+        total_value = totals.rituals.get(ritual.id, 0)
         
         # Calculate yearly target (weekly target * 52 weeks)
         yearly_target = ritual.target_value * 52 if ritual.period == "weekly" else ritual.target_value
         percent = min(100, (total_value / yearly_target) * 100) if yearly_target > 0 else 0
 
-        # Monthly breakdown for this ritual
-        monthly_breakdown = {}
-        for log in logs:
-            month = log.timestamp.strftime("%Y-%m")
-            monthly_breakdown[month] = monthly_breakdown.get(month, 0) + log.value
-
         ritual_stats.append({
             "ritual_id": ritual.id,
             "name": ritual.name,
@@ -130,67 +154,52 @@ def get_yearly_stats(session: Session = Depends(get_session)):
             "unit": ritual.unit,
             "percent": percent,
             "icon": ritual.icon,
-            "monthly_breakdown": monthly_breakdown
+            "monthly_breakdown": totals.ritual_months.get(ritual.id, {})
         })
 
     # Quota statistics
-    quotas = session.exec(select(Quota).order_by(Quota.sort_order)).all()
     quota_stats = []
     
     for quota in quotas:
-        logs = session.exec(
-            select(Log)
-            .where(Log.quota_id == quota.id)
-            .where(Log.timestamp >= start_of_year)
-            .where(Log.metric_type == MetricType.quota)
-        ).all()
-        
-        total_value = sum(log.value for log in logs)
-        
-        # Monthly breakdown for this quota
-        monthly_breakdown = {}
-        for log in logs:
-            month = log.timestamp.strftime("%Y-%m")
-            monthly_breakdown[month] = monthly_breakdown.get(month, 0) + log.value
-        
         quota_stats.append({
             "quota_id": quota.id,
             "name": quota.name,
-            "total": total_value,
+            "total": totals.quotas.get(quota.id, 0),
             "unit": quota.unit,
             "category": quota.category,
             "icon": quota.icon,
             "label": quota.label,
-            "monthly_breakdown": monthly_breakdown
+            "monthly_breakdown": totals.quota_months.get(quota.id, {})
         })
         
     return {
         "year_progress": year_progress,
-        "monthly_activity": monthly_counts,
+        "monthly_activity": totals.monthly_activity,
         "rituals": ritual_stats,
         "quotas": quota_stats
     }
 
-@router.get("/monthly")
-def get_monthly_stats(session: Session = Depends(get_session)):
+@router.get("/monthly", dependencies=[conditional("stats")])
+@cached("stats")
+async def get_monthly_stats(session: AsyncSession = Depends(get_async_session)):
     """Get statistics for the current month"""
-    today = datetime.utcnow().date()
+    today = local_today()
     start_of_month = datetime(today.year, today.month, 1)
     
-    # Get all rituals
-    rituals = session.exec(select(Ritual)).all()
+    rituals = (await session.exec(select(Ritual))).all()
+    quotas = (await session.exec(select(Quota).order_by(Quota.sort_order))).all()
+
+    totals = await load_period_totals(
+        session,
+        start_of_month,
+        ritual_ids=[r.id for r in rituals],
+        quota_ids=[q.id for q in quotas],
+    )
+
     ritual_stats = []
     
     for ritual in rituals:
-        # Sum logs for this ritual this month
-        logs = session.exec(
-            select(Log)
-            .where(Log.ritual_id == ritual.id)
-            .where(Log.timestamp >= start_of_month)
-            .where(Log.metric_type == MetricType.ritual)
-        ).all()
-        
-        current_value = sum(log.value for log in logs)
+        current_value = totals.rituals.get(ritual.id, 0)
         
         # Calculate monthly target (weekly target * ~4.33 weeks per month)
         monthly_target = ritual.target_value * 4.33 if ritual.period == "weekly" else ritual.target_value / 12
@@ -207,22 +216,13 @@ def get_monthly_stats(session: Session = Depends(get_session)):
         })
     
     # Get quota stats for the month
-    quotas = session.exec(select(Quota).order_by(Quota.sort_order)).all()
     quota_stats = []
     
     for quota in quotas:
-        logs = session.exec(
-            select(Log)
-            .where(Log.quota_id == quota.id)
-            .where(Log.timestamp >= start_of_month)
-            .where(Log.metric_type == MetricType.quota)
-        ).all()
-        
-        total_value = sum(log.value for log in logs)
         quota_stats.append({
             "quota_id": quota.id,
             "name": quota.name,
-            "total": total_value,
+            "total": totals.quotas.get(quota.id, 0),
             "unit": quota.unit,
             "category": quota.category,
             "icon": quota.icon,
@@ -234,3 +234,126 @@ def get_monthly_stats(session: Session = Depends(get_session)):
         "quotas": quota_stats,
         "month_start": start_of_month.date()
     }
+
+@router.get("/range", dependencies=[conditional("stats")])
+@cached("stats")
+async def get_range_stats(
+    start: date,
+    end: date,
+    granularity: Literal["day", "week", "month"] = "week",
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Per-ritual and per-quota time series between `start` (inclusive) and
+    `end` (exclusive). `buckets` lists the first day of every day, week
+    (Monday) or month in the range, and each `series` has one total per bucket.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    # Counted before the list is built, so a huge range is refused cheaply
+    if bucket_count(start, end, granularity) > MAX_RANGE_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range has more than {MAX_RANGE_BUCKETS} {granularity} buckets")
+    buckets = bucket_starts(start, end, granularity)
+
+    rituals = (await session.exec(select(Ritual).order_by(Ritual.sort_order))).all()
+    quotas = (await session.exec(select(Quota).order_by(Quota.sort_order))).all()
+
+    # Bucketing and summing happen in one grouped query over the daily rollup
+    series = await load_range_series(
+        session,
+        start,
+        end,
+        granularity,
+        ritual_ids=[r.id for r in rituals],
+        quota_ids=[q.id for q in quotas],
+    )
+    keys = [bucket.isoformat() for bucket in buckets]
+
+    def points(kind: str, entity_id: int):
+        totals = series.get((kind, entity_id), {})
+        return [totals.get(key, 0) for key in keys]
+
+    ritual_stats = []
+    for ritual in rituals:
+        values = points("ritual", ritual.id)
+        ritual_stats.append({
+            "ritual_id": ritual.id,
+            "name": ritual.name,
+            "unit": ritual.unit,
+            "icon": ritual.icon,
+            "target": ritual.target_value,
+            "total": sum(values),
+            "series": values,
+        })
+
+    quota_stats = []
+    for quota in quotas:
+        values = points("quota", quota.id)
+        quota_stats.append({
+            "quota_id": quota.id,
+            "name": quota.name,
+            "unit": quota.unit,
+            "category": quota.category,
+            "icon": quota.icon,
+            "label": quota.label,
+            "total": sum(values),
+            "series": values,
+        })
+
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "buckets": keys,
+        "rituals": ritual_stats,
+        "quotas": quota_stats,
+    }
+
+@router.get("/streaks", dependencies=[conditional("stats")])
+@cached("stats")
+async def get_streaks(
+    history_weeks: int = Query(0, ge=0, le=520),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Current and longest runs of weeks on target per ritual, with the hit rate
+    since the ritual's first logged week. `history_weeks` adds the last N
+    weeks' totals and hits, oldest first.
+    """
+    this_week = week_start(local_today())
+    rituals = (await session.exec(select(Ritual).order_by(Ritual.sort_order))).all()
+    summaries = {s.ritual_id: s for s in (await session.exec(select(RitualStreak))).all()}
+
+    history = {}
+    weeks = [this_week - timedelta(weeks=n) for n in range(history_weeks - 1, -1, -1)]
+    if weeks:
+        rows = await session.exec(select(RitualWeek.ritual_id, RitualWeek.week_start, RitualWeek.total).where(RitualWeek.week_start >= weeks[0]))
+        for ritual_id, week, total in rows:
+            history.setdefault(ritual_id, {})[week] = total
+
+    streaks = []
+    for ritual in rituals:
+        summary = summaries.get(ritual.id) or RitualStreak(ritual_id=ritual.id)
+        weeks_tracked = (this_week - summary.first_week).days // 7 + 1 if summary.first_week else 0
+        entry = {
+            "ritual_id": ritual.id,
+            "name": ritual.name,
+            "icon": ritual.icon,
+            "weekly_target": weekly_target(ritual),
+            "current_streak": current_streak(summary, this_week),
+            "hit_this_week": summary.latest_run_end == this_week,
+            "longest_streak": summary.longest_run,
+            "longest_streak_end": summary.longest_run_end,
+            "weeks_hit": summary.weeks_hit,
+            "weeks_tracked": weeks_tracked,
+            "hit_rate": summary.weeks_hit / weeks_tracked if weeks_tracked else 0,
+        }
+        if weeks:
+            totals = history.get(ritual.id, {})
+            entry["history"] = [
+                {"week_start": week, "total": totals.get(week, 0), "hit": totals.get(week, 0) >= weekly_target(ritual)}
+                for week in weeks
+            ]
+        streaks.append(entry)
+
+    return {"week_start": this_week, "rituals": streaks}
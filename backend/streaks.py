@@ -0,0 +1,142 @@
+"""
+Streak engine for rituals.
+
+`ritual_week` holds each ritual's total per week (Monday start). It is fed by
+the same deltas as the daily rollup, so every log write keeps it current
+without rescanning logs. After a change, the affected rituals' rows in
+`ritual_streak` are recomputed from their weeks with one gaps-and-islands
+query: a week is on target when its total reaches the ritual's weekly
+target (`target_value`, or a 52nd of it for annual rituals), and
+consecutive on-target weeks form a run.
+
+Reading a ritual's current streak is then a single summary row plus a date
+comparison, independent of how many logs or weeks exist.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Integer, case, cast, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from archive import all_logs
+from calendar_days import cover_logs
+from models import CalendarDay, MetricType, Ritual, RitualStreak, RitualWeek
+
+WEEKS_PER_YEAR = 52
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def weekly_target(ritual: Ritual) -> float:
+    return ritual.target_value if ritual.period == "weekly" else ritual.target_value / WEEKS_PER_YEAR
+
+
+def apply_week_deltas(session: Session, deltas: Dict[tuple, List[float]]):
+    """
+    Fold rollup deltas (keyed like rollup.KEY_COLUMNS) into ritual_week and
+    refresh the streaks of every ritual whose weeks changed.
+    """
+    weeks = {}
+    for (metric_type, ritual_id, quota_id, day), (total, entries) in deltas.items():
+        if metric_type != MetricType.ritual or not ritual_id or not (total or entries):
+            continue
+        delta = weeks.setdefault((ritual_id, week_start(day)), [0.0, 0])
+        delta[0] += total
+        delta[1] += entries
+    rows = [
+        {"ritual_id": ritual_id, "week_start": week, "total": total, "entries": entries}
+        for (ritual_id, week), (total, entries) in weeks.items()
+        if total or entries
+    ]
+    if not rows:
+        return
+
+    stmt = insert(RitualWeek.__table__)
+    session.exec(stmt.on_conflict_do_update(
+        index_elements=["ritual_id", "week_start"],
+        set_={
+            "total": RitualWeek.total + stmt.excluded.total,
+            "entries": RitualWeek.entries + stmt.excluded.entries,
+        },
+    ), params=rows)
+
+    ritual_ids = {row["ritual_id"] for row in rows}
+    if any(row["entries"] < 0 for row in rows):
+        session.exec(
+            delete(RitualWeek)
+            .where(RitualWeek.ritual_id.in_(ritual_ids))
+            .where(RitualWeek.entries <= 0)
+        )
+    refresh_streaks(session, ritual_ids)
+
+
+def refresh_streaks(session: Session, ritual_ids: Optional[Iterable[int]] = None):
+    """Recompute ritual_streak for `ritual_ids` (all rituals when None) from ritual_week."""
+    target = case((Ritual.period == "weekly", Ritual.target_value), else_=Ritual.target_value / WEEKS_PER_YEAR)
+    hits = select(
+        RitualWeek.ritual_id,
+        RitualWeek.week_start,
+        # Constant within a run of consecutive weeks: week number minus position among hits
+        (
+            cast(func.julianday(RitualWeek.week_start), Integer) / 7
+            - func.row_number().over(partition_by=RitualWeek.ritual_id, order_by=RitualWeek.week_start)
+        ).label("run"),
+    ).join(Ritual, Ritual.id == RitualWeek.ritual_id).where(RitualWeek.total >= target)
+    first_weeks = select(RitualWeek.ritual_id, func.min(RitualWeek.week_start)).group_by(RitualWeek.ritual_id)
+    if ritual_ids is not None:
+        ritual_ids = list(ritual_ids)
+        hits = hits.where(RitualWeek.ritual_id.in_(ritual_ids))
+        first_weeks = first_weeks.where(RitualWeek.ritual_id.in_(ritual_ids))
+    hits = hits.subquery()
+    runs = select(hits.c.ritual_id, func.count(), func.max(hits.c.week_start)).group_by(hits.c.ritual_id, hits.c.run)
+
+    summaries = {
+        ritual_id: {"ritual_id": ritual_id, "first_week": first, "weeks_hit": 0, "latest_run": 0,
+                    "latest_run_end": None, "longest_run": 0, "longest_run_end": None}
+        for ritual_id, first in session.exec(first_weeks)
+    }
+    for ritual_id, length, end in session.exec(runs):
+        summary = summaries[ritual_id]
+        summary["weeks_hit"] += length
+        if summary["latest_run_end"] is None or end > summary["latest_run_end"]:
+            summary["latest_run"], summary["latest_run_end"] = length, end
+        if (length, end) > (summary["longest_run"], summary["longest_run_end"] or date.min):
+            summary["longest_run"], summary["longest_run_end"] = length, end
+
+    clear = delete(RitualStreak)
+    if ritual_ids is not None:
+        clear = clear.where(RitualStreak.ritual_id.in_(ritual_ids))
+    session.exec(clear)
+    if summaries:
+        session.exec(insert(RitualStreak.__table__), params=list(summaries.values()))
+
+
+def rebuild_streaks(session: Session) -> int:
+    """
+    Recompute ritual_week from the log table and the archive, and every
+    streak from it. Returns the number of week rows.
+    """
+    cover_logs(session)
+    logs = all_logs(session)
+    grouped = (
+        select(logs.c.ritual_id, CalendarDay.week_start, func.sum(logs.c.value), func.count())
+        .join(CalendarDay, CalendarDay.day == func.date(logs.c.timestamp))
+        .where(logs.c.metric_type == MetricType.ritual, logs.c.ritual_id.is_not(None))
+        .group_by(logs.c.ritual_id, CalendarDay.week_start)
+    )
+    session.exec(delete(RitualWeek))
+    session.exec(insert(RitualWeek).from_select(["ritual_id", "week_start", "total", "entries"], grouped))
+    refresh_streaks(session)
+    return session.exec(select(func.count()).select_from(RitualWeek)).one()
+
+
+def current_streak(summary: RitualStreak, today: date) -> int:
+    """Length of the run still alive: it must include this week or, as this week is not over, last week."""
+    this_week = week_start(today)
+    if summary.latest_run_end and summary.latest_run_end >= this_week - timedelta(days=7):
+        return summary.latest_run
+    return 0
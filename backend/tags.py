@@ -0,0 +1,54 @@
+"""
+Normalized tag index.
+
+`Log.tag` is a free-form, space-separated string. `log_tag` stores one
+(tag, log_id) row per distinct word, maintained by the log write routes, so
+autocomplete, usage counts and tag filters are index lookups instead of
+splitting every log's tag string on each request.
+"""
+
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from models import Log, LogTag
+
+REBUILD_BATCH = 10_000
+
+
+def split_tags(tag: Optional[str]) -> List[str]:
+    return sorted(set(tag.split())) if tag else []
+
+
+def add_log_tags(session: Session, logs: Iterable[Log]):
+    """Index the tags of logs that have no rows yet (new logs). Logs must have ids."""
+    rows = [{"tag": tag, "log_id": log.id} for log in logs for tag in split_tags(log.tag)]
+    if rows:
+        session.exec(insert(LogTag.__table__), params=rows)
+
+
+def clear_log_tags(session: Session, log_ids: Iterable[int]):
+    log_ids = list(log_ids)
+    if log_ids:
+        session.exec(delete(LogTag).where(LogTag.log_id.in_(log_ids)))
+
+
+def replace_log_tags(session: Session, logs: Iterable[Log]):
+    """Re-index the tags of logs whose tag string may have changed."""
+    logs = list(logs)
+    clear_log_tags(session, [log.id for log in logs])
+    add_log_tags(session, logs)
+
+
+def rebuild_log_tags(session: Session) -> int:
+    """Recompute the whole tag index from the log table. Returns the number of tag rows."""
+    session.exec(delete(LogTag))
+    count = 0
+    query = select(Log.id, Log.tag).where(Log.tag != None).execution_options(yield_per=REBUILD_BATCH)
+    for chunk in session.exec(query).partitions():
+        rows = [{"tag": tag, "log_id": log_id} for log_id, tag_str in chunk for tag in split_tags(tag_str)]
+        if rows:
+            session.exec(insert(LogTag.__table__), params=rows)
+        count += len(rows)
+    return count
@@ -0,0 +1,120 @@
+"""
+Data-version counters and conditional GETs.
+
+Each namespace ("rituals", "quotas", "rewards", "settings", "stats",
+"logs") has a counter in the data_version table. Write routes wrapped in
+`cache.invalidates` bump their namespaces inside the same transaction as
+the write, via a before_commit hook. Read routes declare
+`dependencies=[conditional(...)]`: the dependency reads the counters on the
+async engine with one primary-key lookup, sets an ETag, and answers 304 when the client's
+If-None-Match still matches, before the route's own queries run.
+
+The counters live in the database rather than in memory, so every worker
+process derives the same ETag. In multi-user mode each shard has its own
+counters, so the ETag also names the shard. The dependency also leaves the
+counters it read in `current_versions`, and `cache.cached` serves only an
+entry built from those same versions, so a cached body never goes out under
+an ETag newer than its data.
+"""
+
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import SHARD_DIR, USER_HEADER, current_shard_key, get_async_session
+from local_time import local_today
+from models import DataVersion
+
+NAMESPACES = ("rituals", "quotas", "rewards", "settings", "stats", "logs")
+
+PENDING_KEY = "data_version_bumps"
+
+# The counters behind the current request's ETag, set by `conditional`
+current_versions: ContextVar[Optional[Dict[str, int]]] = ContextVar("current_versions", default=None)
+
+
+def track_writes(session: Session, namespaces: Iterable[str]):
+    """Bump `namespaces` when `session` next commits."""
+    session.info.setdefault(PENDING_KEY, set()).update(namespaces)
+
+
+def untrack_writes(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def bump_data_versions(session: Session, namespaces: Iterable[str]):
+    """Increment the counters of `namespaces` in the current transaction."""
+    rows = [{"namespace": namespace, "version": 1} for namespace in sorted(namespaces)]
+    if not rows:
+        return
+    stmt = insert(DataVersion.__table__)
+    session.exec(stmt.on_conflict_do_update(
+        index_elements=["namespace"],
+        set_={"version": DataVersion.__table__.c.version + 1},
+    ), params=rows)
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _bump_on_commit(session):
+    # Not popped here: a retried route commits again and must bump again
+    namespaces = session.info.get(PENDING_KEY)
+    if namespaces:
+        bump_data_versions(session, namespaces)
+
+
+def _versions_query(namespaces: List[str]):
+    return select(DataVersion.namespace, DataVersion.version).where(DataVersion.namespace.in_(namespaces))
+
+
+async def data_versions(session: AsyncSession, namespaces: Iterable[str]) -> Dict[str, int]:
+    namespaces = list(namespaces)
+    versions = dict.fromkeys(namespaces, 0)
+    versions.update((await session.exec(_versions_query(namespaces))).all())
+    return versions
+
+
+def read_data_versions(session: Session, namespaces: Iterable[str]) -> Dict[str, int]:
+    """`data_versions` on a sync session."""
+    namespaces = list(namespaces)
+    versions = dict.fromkeys(namespaces, 0)
+    versions.update(session.exec(_versions_query(namespaces)).all())
+    return versions
+
+
+def make_etag(versions: Dict[str, int], scope: str = "") -> str:
+    tag = "-".join(f"{namespace}.{version}" for namespace, version in sorted(versions.items()))
+    if scope:
+        tag = f"{scope}:{tag}"
+    if "stats" in versions:
+        # Stats cover the current week/month/year, so they also change with the date
+        tag += f"-{local_today().isoformat()}"
+    return f'W/"{tag}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # Weak comparison: W/"x" and "x" identify the same representation
+    return "*" in candidates or etag.removeprefix("W/") in (c.removeprefix("W/") for c in candidates)
+
+
+def conditional(*namespaces: str):
+    """Dependency that tags a read route's response and short-circuits unchanged ones with a 304."""
+    async def check(request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
+        versions = await data_versions(session, namespaces)
+        current_versions.set(versions)
+        etag = make_etag(versions, current_shard_key.get())
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        # Let browsers keep the body but revalidate on every request
+        response.headers["Cache-Control"] = "no-cache"
+        if SHARD_DIR:
+            response.headers["Vary"] = USER_HEADER
+    return Depends(check)
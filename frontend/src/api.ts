@@ -3,3 +3,17 @@ import axios from 'axios';
 export const api = axios.create({
     baseURL: '/api',
 });
+
+/**
+ * Fetch every page of a /logs/ listing by following the X-Next-Cursor header
+ */
+export async function fetchAllLogs<T>(params: Record<string, string | number>): Promise<T[]> {
+    const logs: T[] = [];
+    let cursor: string | undefined;
+    do {
+        const res = await api.get('/logs/', { params: { ...params, limit: 1000, ...(cursor ? { cursor } : {}) } });
+        logs.push(...res.data);
+        cursor = res.headers['x-next-cursor'];
+    } while (cursor);
+    return logs;
+}
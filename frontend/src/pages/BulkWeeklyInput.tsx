@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { api } from '../api';
+import { api, fetchAllLogs } from '../api';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -57,18 +57,22 @@ export const BulkWeeklyInput: React.FC = () => {
 
     const fetchWeekLogs = async () => {
         try {
-            const res = await api.get('/logs/');
-            const logs: Log[] = res.data;
+            const weekDays = getDaysOfWeek();
+            const weekStart = weekDays[0];
+            const weekEnd = weekDays[6];
+
+            // Only pull the ritual logs inside the visible week
+            const logs = await fetchAllLogs<Log>({
+                start: `${formatDateKey(weekStart)}T00:00:00`,
+                end: `${formatDateKey(addDays(weekStart, 7))}T00:00:00`,
+                metric_type: 'ritual',
+            });
 
             const newWeekData: WeekData = {};
             rituals.forEach((ritual) => {
                 newWeekData[ritual.id] = {};
             });
 
-            const weekDays = getDaysOfWeek();
-            const weekStart = weekDays[0];
-            const weekEnd = weekDays[6];
-
             logs.forEach((log) => {
                 const logDate = getAEDTDate(log.timestamp);
                 if (logDate >= weekStart && logDate <= weekEnd && log.ritual_id) {
@@ -132,6 +136,7 @@ export const BulkWeeklyInput: React.FC = () => {
         try {
             let updateCount = 0;
             let createCount = 0;
+            const operations: object[] = [];
 
             for (const ritualId in weekData) {
                 for (const day in weekData[ritualId]) {
@@ -162,18 +167,23 @@ export const BulkWeeklyInput: React.FC = () => {
                         };
 
                         if (cellData.logId && value > 0) {
-                            await api.put(`/logs/${cellData.logId}`, logData);
+                            operations.push({ action: 'update', log_id: cellData.logId, log: logData });
                             updateCount++;
                         } else if (value > 0) {
-                            await api.post('/logs/', logData);
+                            operations.push({ action: 'create', log: logData });
                             createCount++;
                         } else if (cellData.logId && value === 0) {
-                            await api.delete(`/logs/${cellData.logId}`);
+                            operations.push({ action: 'delete', log_id: cellData.logId });
                         }
                     }
                 }
             }
 
+            // Save the whole week in one request and one transaction
+            if (operations.length > 0) {
+                await api.post('/logs/batch', { operations });
+            }
+
             alert(`Successfully saved! Created: ${createCount}, Updated: ${updateCount}`);
             await fetchWeekLogs();
         } catch (e) {
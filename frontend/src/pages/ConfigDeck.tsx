@@ -50,14 +50,13 @@ export const ConfigDeck: React.FC = () => {
     const [editedQuota, setEditedQuota] = useState<Quota | null>(null);
 
     const fetchConfig = async () => {
-        const r = await api.get('/config/rituals');
-        setRituals(r.data.sort((a: Ritual, b: Ritual) => (a.sort_order || 0) - (b.sort_order || 0)));
-        const q = await api.get('/quotas/');
-        setQuotas(q.data.sort((a: Quota, b: Quota) => (a.sort_order || 0) - (b.sort_order || 0)));
-        const rw = await api.get('/config/rewards');
-        setRewards(rw.data);
-        const dt = await api.get('/config/settings/dice_threshold');
-        if (dt.data) setDiceThreshold(dt.data.value);
+        // One round trip, all read from the same snapshot
+        const { data } = await api.get('/bootstrap');
+        setRituals(data.rituals.sort((a: Ritual, b: Ritual) => (a.sort_order || 0) - (b.sort_order || 0)));
+        setQuotas(data.quotas.sort((a: Quota, b: Quota) => (a.sort_order || 0) - (b.sort_order || 0)));
+        setRewards(data.rewards);
+        const dt = data.settings.find((s: { key: string }) => s.key === 'dice_threshold');
+        if (dt) setDiceThreshold(dt.value);
     };
 
     useEffect(() => {
@@ -26,6 +26,37 @@ interface WeeklyStats {
         label?: string;
     }[];
     unlock_percent: number;
+    week_start?: string;
+}
+
+/** Changed parts of the weekly stats, as pushed by /stats/stream */
+interface WeeklyStatsDelta {
+    rituals?: WeeklyStats['rituals'];
+    quotas?: WeeklyStats['quotas'];
+    removed_rituals?: number[];
+    removed_quotas?: number[];
+    rituals_order?: number[];
+    quotas_order?: number[];
+    unlock_percent?: number;
+    week_start?: string;
+}
+
+function mergeEntries<T>(entries: T[], changed: T[] | undefined, removed: number[] | undefined, order: number[] | undefined, id: (entry: T) => number): T[] {
+    const byId = new Map(entries.map(entry => [id(entry), entry]));
+    (removed || []).forEach(entryId => byId.delete(entryId));
+    (changed || []).forEach(entry => byId.set(id(entry), entry));
+    const ids = order || Array.from(byId.keys());
+    return ids.filter(entryId => byId.has(entryId)).map(entryId => byId.get(entryId)!);
+}
+
+function applyDelta(stats: WeeklyStats, delta: WeeklyStatsDelta): WeeklyStats {
+    return {
+        ...stats,
+        rituals: mergeEntries(stats.rituals, delta.rituals, delta.removed_rituals, delta.rituals_order, r => r.ritual_id),
+        quotas: mergeEntries(stats.quotas, delta.quotas, delta.removed_quotas, delta.quotas_order, q => q.quota_id),
+        unlock_percent: delta.unlock_percent ?? stats.unlock_percent,
+        week_start: delta.week_start ?? stats.week_start,
+    };
 }
 
 interface Reward {
@@ -45,15 +76,27 @@ export const WeeklyTracker: React.FC = () => {
 
     useEffect(() => {
         fetchStats();
-        api.get('/config/rewards').then(r => setRewards(r.data)).catch(console.error);
-        api.get('/config/settings/dice_threshold').then(r => {
-            if (r.data) setDiceThreshold(parseInt(r.data.value));
-        }).catch(console.error);
+
+        // Live updates: a full snapshot on (re)connect, then only what changed
+        const source = new EventSource('/api/stats/stream');
+        source.addEventListener('snapshot', e => setStats(JSON.parse((e as MessageEvent).data)));
+        source.addEventListener('delta', e => {
+            const delta: WeeklyStatsDelta = JSON.parse((e as MessageEvent).data);
+            setStats(prev => prev && applyDelta(prev, delta));
+        });
+
+        return () => source.close();
     }, []);
 
     const fetchStats = () => {
-        api.get('/stats/weekly')
-            .then(r => setStats(r.data))
+        // Stats, rewards and the dice threshold in one round trip
+        api.get('/bootstrap')
+            .then(r => {
+                setStats(r.data.weekly);
+                setRewards(r.data.rewards);
+                const threshold = r.data.settings.find((s: { key: string }) => s.key === 'dice_threshold');
+                if (threshold) setDiceThreshold(parseInt(threshold.value));
+            })
             .catch(e => {
                 console.error(e);
                 setError('Failed to load stats. Please check backend connection.');